@@ -25,6 +25,7 @@
     'views/control_total_label_views.xml',
     'views/mrp_master_type_views.xml',
     'views/mrp_master_order_views.xml',
+    'views/mrp_master_archive_views.xml',
     'views/mrp_master_order_ct_views.xml',
     'views/quality_alert_views.xml',
     'views/stock_scrap_views.xml',
@@ -41,10 +42,14 @@
     'wizard/mrp_import_result_wizard_views.xml',
     'wizard/mrp_master_confirm_wizard_views.xml',
     'wizard/opt_labels_wizard_views.xml',
+    'wizard/mrp_master_line_export_wizard_views.xml',
+    'wizard/mrp_master_export_range_wizard_views.xml',
     'views/menuitems.xml',
     'views/opt_reports_views.xml',
+    'views/opt_report_snapshot_views.xml',
     'views/stock_return_picking_views.xml',
     'actions/workorder_actions.xml',
+    'actions/mrp_master_order_actions.xml',
 
     # 4. All Menus, loaded after the actions they depend on
     'views/recetas_pvb_views.xml',
@@ -172,5 +177,5 @@
  'name': 'Alterben MRP Crilamyt (Master Order)',
  'post_init_hook': 'post_init_hook',
  'summary': 'Módulo unificado para CRILAMYT que extiende Orden Maestra con Control Total y Novedades de Workorder.',
- 'version': '17.0.1.1.22',
+ 'version': '17.0.1.1.23',
  'website': 'https://alterben.ec'}
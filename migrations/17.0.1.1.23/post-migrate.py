@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from odoo import SUPERUSER_ID, api
+
+
+def migrate(cr, version):
+    """Crear las secuencias de código de los Tipos existentes (antes se creaban al confirmar).
+
+    También completa master_order_count en los pedidos insertados por SQL sin ese valor y la
+    fecha de los datos de entrada de las fotos de reportes ya guardadas.
+    """
+    if not version:
+        return
+    cr.execute("UPDATE mrp_pedido_original SET master_order_count = 0 WHERE master_order_count IS NULL")
+    cr.execute("UPDATE mrp_report_snapshot SET inputs_built_at = create_date WHERE inputs_built_at IS NULL")
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env["mrp.master.type"].with_context(active_test=False).search([])._ensure_code_sequences()
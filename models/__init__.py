@@ -10,6 +10,11 @@ from . import stock_picking
 from . import ct_completion
 from . import mrp_master_type, mrp_master_order
 from . import mrp_master_order_optA
+from . import mrp_master_export
+from . import mrp_master_order_totals
+from . import mrp_master_archive
+from . import mrp_master_refresh_queue
+from . import mrp_trigram_search
 from . import mrp_master_order_ct
 from . import receta_pvb
 from . import print_wizard
@@ -32,4 +37,6 @@ from . import stock_return_picking
 from .mrp_master_order_ct import MrpMasterOrderLineCT
 
 from . import opt_reports
+from . import opt_scenarios
+from . import opt_report_snapshot
 
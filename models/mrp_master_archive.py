@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.osv import expression
+from odoo.tools import split_every
+
+from .mrp_master_order import LINE_PARENT_FIELDS, _log_timing
+
+ARCHIVE_STATES = ('done', 'cancel')
+ARCHIVE_BATCH_SIZE = 200
+
+
+class MrpMasterOrderArchiveSummary(models.Model):
+    _name = "mrp.master.order.archive.summary"
+    _description = "Resumen por producto de Orden Maestra archivada"
+    _order = "date_planned desc, id"
+
+    master_id = fields.Many2one("mrp.master.order", "Orden Maestra", required=True, ondelete="cascade", index=True)
+    stage_type = fields.Selection([
+        ('curvado_pvb', 'Curvado / PVB'),
+        ('opt', 'Producto Terminado (OPT)'),
+    ], string="Etapa", index=True)
+    master_state = fields.Selection([
+        ("draft", "Borrador"),
+        ("confirmed", "Confirmada"),
+        ("done", "Hecha"),
+        ("cancel", "Cancelada")
+    ], string="Estado")
+    type_id = fields.Many2one("mrp.master.type", "Tipo")
+    date_planned = fields.Datetime("Fecha planificada", index=True)
+    product_id = fields.Many2one("product.product", "Producto", index=True)
+    planned_qty = fields.Float("Cantidad")
+    real_qty = fields.Float("Cantidad real")
+    scrap_qty = fields.Float("Desechos")
+    pending_qty = fields.Float("Pendiente")
+    line_count = fields.Integer("# Líneas")
+
+
+class MrpMasterOrder(models.Model):
+    _inherit = "mrp.master.order"
+
+    active = fields.Boolean(
+        "Activo",
+        default=True,
+        index=True,
+        help="Las órdenes archivadas (y sus líneas) quedan fuera de las búsquedas y reportes habituales.",
+    )
+    archive_summary_ids = fields.One2many(
+        "mrp.master.order.archive.summary", "master_id", string="Resumen archivado", readonly=True
+    )
+
+    def _get_all_lines(self):
+        """Líneas de las órdenes en cualquiera de las pestañas, incluidas las archivadas."""
+        Line = self.env["mrp.master.order.line"].with_context(active_test=False)
+        if not self:
+            return Line
+        domain = expression.OR([[(fname, "in", self.ids)] for fname in LINE_PARENT_FIELDS])
+        return Line.search(domain)
+
+    def _prepare_archive_summary_vals(self):
+        """Totales por producto de las líneas de la etapa (las mismas que usa el arrastre)."""
+        vals_list = []
+        for rec in self:
+            totals = defaultdict(lambda: [0.0, 0.0, 0.0, 0.0, 0])
+            for line in rec._get_stage_lines(rec.stage_type):
+                if not line.product_id:
+                    continue
+                acc = totals[line.product_id.id]
+                acc[0] += line.product_qty or 0.0
+                acc[1] += line.cantidad_real or 0.0
+                acc[2] += line.scrap_qty or 0.0
+                acc[3] += line.pending_qty or 0.0
+                acc[4] += 1
+            for product_id, (planned, real, scrap, pending, count) in totals.items():
+                vals_list.append({
+                    "master_id": rec.id,
+                    "stage_type": rec.stage_type,
+                    "master_state": rec.state,
+                    "type_id": rec.type_id.id,
+                    "date_planned": rec.date_planned,
+                    "product_id": product_id,
+                    "planned_qty": planned,
+                    "real_qty": real,
+                    "scrap_qty": scrap,
+                    "pending_qty": pending,
+                    "line_count": count,
+                })
+        return vals_list
+
+    def action_archive(self):
+        """Archivar órdenes hechas/canceladas: guarda el resumen por producto y archiva sus líneas."""
+        invalid = self.filtered(lambda r: r.state not in ARCHIVE_STATES)
+        if invalid:
+            raise UserError(_(
+                "Solo se pueden archivar Órdenes Maestras hechas o canceladas: %s"
+            ) % ", ".join(invalid.mapped("display_name")))
+        to_archive = self.filtered("active")
+        if to_archive:
+            start = time.perf_counter()
+            Summary = self.env["mrp.master.order.archive.summary"].sudo()
+            Summary.search([("master_id", "in", to_archive.ids)]).unlink()
+            Summary.create(to_archive._prepare_archive_summary_vals())
+            to_archive._get_all_lines().filtered("active").write({"active": False})
+            _log_timing("mrp.master.order.action_archive", start, f"masters={len(to_archive)}")
+        return super().action_archive()
+
+    def action_unarchive(self):
+        """Restaurar órdenes archivadas con sus líneas; el resumen deja de usarse."""
+        to_restore = self.filtered(lambda r: not r.active)
+        if to_restore:
+            to_restore._get_all_lines().filtered(lambda l: not l.active).write({"active": True})
+            self.env["mrp.master.order.archive.summary"].sudo().search(
+                [("master_id", "in", to_restore.ids)]
+            ).unlink()
+        return super().action_unarchive()
+
+    @api.model
+    def cron_archive_closed_masters(self):
+        """Archivar órdenes hechas/canceladas más antiguas que mrp_master.archive_after_days."""
+        try:
+            days = int(self.env["ir.config_parameter"].sudo().get_param("mrp_master.archive_after_days", default="365"))
+        except (TypeError, ValueError):
+            days = 365
+        if days <= 0:
+            return True
+        limit_date = fields.Datetime.now() - timedelta(days=days)
+        masters = self.search([
+            ("state", "in", list(ARCHIVE_STATES)),
+            ("date_planned", "<", limit_date),
+        ], order="date_planned, id")
+        for chunk in split_every(ARCHIVE_BATCH_SIZE, masters.ids):
+            batch = self.browse(chunk)
+            batch.action_archive()
+            batch.invalidate_recordset()
+        return True
+
+
+class MrpMasterOrderLine(models.Model):
+    _inherit = "mrp.master.order.line"
+
+    active = fields.Boolean("Activo", default=True, index=True)
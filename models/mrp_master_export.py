@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import date, datetime
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+
+from .mrp_master_order import TAB_PARENT_FIELDS, _log_timing
+
+_logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 1000
+XLSX_MAX_ROWS = 1048576
+TAB_ORDER = list(TAB_PARENT_FIELDS)
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+
+def _get_xlsxwriter():
+    try:
+        import xlsxwriter  # type: ignore
+    except Exception:
+        try:
+            from odoo.tools.misc import xlsxwriter  # type: ignore
+        except Exception:
+            raise UserError(_("No se puede exportar a XLS porque falta la librería Python 'xlsxwriter' en el servidor."))
+    return xlsxwriter
+
+
+def _safe_filename_part(value, default):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", value or "").strip("_") or default
+
+
+def _iter_export_rows(model, ids, field_names, chunk_size=EXPORT_CHUNK_SIZE):
+    """Genera filas de export_data por bloques de ids y libera la caché de cada bloque."""
+    for chunk in split_every(chunk_size, ids):
+        records = model.browse(chunk)
+        for row in records.export_data(field_names)["datas"]:
+            yield row
+        records.invalidate_recordset()
+
+
+def _xlsx_write_value(sheet, row_idx, col_idx, value, field_type, formats):
+    """Escribir la celda con su tipo nativo (los números siguen siendo números)."""
+    if field_type == "boolean":
+        sheet.write_boolean(row_idx, col_idx, bool(value))
+        return
+    if value is None or value is False or value == "":
+        return
+    if field_type in ("integer", "float", "monetary"):
+        try:
+            sheet.write_number(row_idx, col_idx, float(value))
+        except (TypeError, ValueError):
+            sheet.write_string(row_idx, col_idx, str(value))
+        return
+    if field_type in ("date", "datetime") and isinstance(value, (date, datetime)):
+        sheet.write_datetime(row_idx, col_idx, value, formats[field_type])
+        return
+    sheet.write_string(row_idx, col_idx, str(value))
+
+
+def _xlsx_write_sheet(workbook, formats, used_names, sheet_name, headers, field_types, rows):
+    """Escribe las filas en orden (requisito de constant_memory); abre hojas nuevas al llegar al límite."""
+    sheet = None
+    row_idx = XLSX_MAX_ROWS
+    part = 0
+    count = 0
+    for row in rows:
+        if row_idx >= XLSX_MAX_ROWS:
+            part += 1
+            base = (sheet_name or "XLS")[:31]
+            name = base if part == 1 else f"{base[:26]} ({part})"
+            while name.lower() in used_names:
+                part += 1
+                name = f"{base[:26]} ({part})"
+            used_names.add(name.lower())
+            sheet = workbook.add_worksheet(name)
+            for col_idx, header in enumerate(headers):
+                sheet.write_string(0, col_idx, header, formats["header"])
+            row_idx = 1
+        for col_idx, value in enumerate(row):
+            _xlsx_write_value(sheet, row_idx, col_idx, value, field_types[col_idx], formats)
+        row_idx += 1
+        count += 1
+    return count
+
+
+def _unlink_quietly(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _write_xlsx_file(sheets):
+    """Escribe las hojas (name, headers, types, rows) en un archivo temporal y devuelve (ruta, filas).
+
+    El llamador es dueño del archivo: debe pasarlo a _create_attachment_from_path o borrarlo.
+    """
+    xlsxwriter = _get_xlsxwriter()
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    total_rows = 0
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        formats = {
+            "header": workbook.add_format({"bold": True}),
+            "date": workbook.add_format({"num_format": "yyyy-mm-dd"}),
+            "datetime": workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"}),
+        }
+        used_names = set()
+        for spec in sheets:
+            total_rows += _xlsx_write_sheet(
+                workbook, formats, used_names, spec["name"], spec["headers"], spec["types"], spec["rows"]
+            )
+        if not used_names:
+            workbook.add_worksheet("XLS")
+        workbook.close()
+    except Exception:
+        _unlink_quietly(path)
+        raise
+    return path, total_rows
+
+
+def _create_attachment_from_path(env, path, vals):
+    """Crea el adjunto a partir del archivo temporal sin cargarlo entero en memoria y borra el temporal.
+
+    Con almacenamiento en filestore el archivo se copia por bloques a su ruta definitiva
+    (sha1 calculado por bloques); con almacenamiento en base de datos no queda otra que leerlo.
+    ir.attachment.create() descarta store_fname/file_size/checksum, así que el registro se crea
+    vacío y esos campos se fijan después por SQL.
+    """
+    Attachment = env["ir.attachment"]
+    try:
+        if Attachment._storage() != "file":
+            with open(path, "rb") as fh:
+                return Attachment.create(dict(vals, raw=fh.read()))
+        sha = hashlib.sha1()
+        size = 0
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(STREAM_BLOCK_SIZE), b""):
+                sha.update(block)
+                size += len(block)
+        checksum = sha.hexdigest()
+        fname = f"{checksum[:2]}/{checksum}"
+        full_path = Attachment._full_path(fname)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            shutil.copyfile(path, full_path)
+        # Si la transacción se revierte, el recolector del filestore elimina el archivo
+        # (solo borra los que no referencia ningún ir_attachment.store_fname).
+        Attachment._mark_for_gc(fname)
+        attachment = Attachment.create(vals)
+        env.cr.execute(
+            """
+            UPDATE ir_attachment
+               SET store_fname = %s, file_size = %s, checksum = %s, mimetype = %s, db_datas = NULL
+             WHERE id = %s
+            """,
+            [fname, size, checksum, vals.get("mimetype") or attachment.mimetype, attachment.id],
+        )
+        attachment.invalidate_recordset(
+            ["store_fname", "file_size", "checksum", "mimetype", "db_datas", "raw", "datas"]
+        )
+        return attachment
+    finally:
+        _unlink_quietly(path)
+
+
+class MrpMasterOrder(models.Model):
+    _inherit = "mrp.master.order"
+
+    def _get_export_sheet_spec(self, tab_key, with_master=False):
+        """Columnas, tipos y ids (ordenados) de una pestaña para el conjunto de órdenes."""
+        parent_field = TAB_PARENT_FIELDS.get(tab_key)
+        field_names = list(self._get_export_tab_fields(tab_key))
+        if not parent_field or not field_names:
+            return False
+        Line = self.env["mrp.master.order.line"]
+        if with_master:
+            field_names = [parent_field] + field_names
+        field_info = Line.fields_get(field_names, ["string", "type"])
+        headers = [field_info[name]["string"] for name in field_names]
+        if with_master:
+            headers[0] = _("Orden Maestra")
+        line_ids = Line.search(
+            [(parent_field, "in", self.ids)],
+            order=f"{parent_field}, sequence, id",
+        ).ids
+        return {
+            "name": self._get_export_tab_label(tab_key),
+            "fields": field_names,
+            "headers": headers,
+            "types": [field_info[name]["type"] for name in field_names],
+            "ids": line_ids,
+        }
+
+    def _export_sheets_to_attachment(self, filename, sheets):
+        """Genera el XLSX en modo constant_memory y lo guarda como adjunto."""
+        start = time.perf_counter()
+        Line = self.env["mrp.master.order.line"]
+        for spec in sheets:
+            spec["rows"] = _iter_export_rows(Line, spec["ids"], spec["fields"])
+        path, total_rows = _write_xlsx_file(sheets)
+        attachment = _create_attachment_from_path(self.env, path, {
+            "name": filename,
+            "type": "binary",
+            "mimetype": XLSX_MIMETYPE,
+            "res_model": self._name,
+            "res_id": self.id if len(self) == 1 else False,
+        })
+        _log_timing("mrp.master.order.export_xlsx", start, f"masters={len(self)} rows={total_rows}")
+        return {
+            "type": "ir.actions.act_url",
+            "url": "/web/content/%s?download=true" % attachment.id,
+            "target": "self",
+        }
+
+    def action_export_xls_tab(self):
+        self.ensure_one()
+        tab = (self.env.context or {}).get('mrp_tab')
+        spec = self._get_export_sheet_spec(tab)
+        if not spec:
+            raise UserError(_("No se pudo determinar las columnas para exportar."))
+        if not spec["ids"]:
+            raise UserError(_("No hay líneas para exportar en esta pestaña."))
+        safe_name = _safe_filename_part(self.name, "orden")
+        safe_label = _safe_filename_part(spec["name"], "lineas")
+        return self._export_sheets_to_attachment(f"{safe_name}_{safe_label}.xlsx", [spec])
+
+    def action_export_xls_all_tabs(self):
+        """Exporta las ocho pestañas de las órdenes seleccionadas a un solo libro (una hoja por pestaña)."""
+        if not self:
+            raise UserError(_("Seleccione al menos una Orden Maestra."))
+        sheets = []
+        for tab in TAB_ORDER:
+            spec = self._get_export_sheet_spec(tab, with_master=True)
+            if spec and spec["ids"]:
+                sheets.append(spec)
+        if not sheets:
+            raise UserError(_("No hay líneas para exportar en las órdenes seleccionadas."))
+        if len(self) == 1:
+            filename = f"{_safe_filename_part(self.name, 'orden')}_pestanas.xlsx"
+        else:
+            filename = f"ordenes_maestras_{fields.Date.context_today(self)}.xlsx"
+        return self._export_sheets_to_attachment(filename, sheets)
+
+    @api.model
+    def action_export_xls_date_range(self, date_from, date_to, stage_type=False):
+        """Exporta todas las órdenes con fecha planificada en el rango [date_from, date_to]."""
+        domain = [("state", "!=", "cancel")]
+        if date_from:
+            domain.append(("date_planned", ">=", fields.Datetime.to_datetime(date_from)))
+        if date_to:
+            domain.append(("date_planned", "<=", fields.Datetime.end_of(fields.Datetime.to_datetime(date_to), "day")))
+        if stage_type:
+            domain.append(("stage_type", "=", stage_type))
+        masters = self.search(domain, order="date_planned, id")
+        if not masters:
+            raise UserError(_("No hay Órdenes Maestras en el rango seleccionado."))
+        return masters.action_export_xls_all_tabs()
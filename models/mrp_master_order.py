@@ -1,19 +1,42 @@
 ﻿# -*- coding: utf-8 -*-
-import base64
-import io
 import logging
 import math
 from collections import defaultdict
-from datetime import timedelta
+from datetime import datetime, timedelta
 import time
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools import sql
 from odoo.tools.float_utils import float_compare, float_is_zero
 import re
 import unicodedata
 
 _logger = logging.getLogger(__name__)
+PEDIDO_SYNC_WATERMARK_PARAM = 'mrp_master.pedido_sync_watermark'
+PEDIDO_SYNC_CHUNK_SIZE = 2000
+# write_date es la hora de inicio de la transacción: una MO confirmada tarde puede quedar
+# por detrás de la marca, así que cada ejecución vuelve a leer esta ventana (el upsert es idempotente).
+PEDIDO_SYNC_SAFETY_WINDOW = timedelta(minutes=15)
 TURN_DURATION_SELECTION = [(str(i), str(i)) for i in range(1, 13)]
+# Campos Many2one con los que una línea cuelga de su orden maestra (uno por pestaña).
+LINE_PARENT_FIELDS = (
+    'master_id',
+    'master_id_hp_t1', 'master_id_hp_t2',
+    'master_id_hg_t1', 'master_id_hg_t2',
+    'master_id_corte', 'master_id_ensamblado',
+    'master_id_prevaciado', 'master_id_inspeccion_final',
+)
+DUPLICATE_CHECK_PARENT_FIELDS = ('master_id_ensamblado', 'master_id_prevaciado', 'master_id_inspeccion_final')
+TAB_PARENT_FIELDS = {
+    'hp_t1': 'master_id_hp_t1',
+    'hp_t2': 'master_id_hp_t2',
+    'hg_t1': 'master_id_hg_t1',
+    'hg_t2': 'master_id_hg_t2',
+    'corte': 'master_id_corte',
+    'ensamblado': 'master_id_ensamblado',
+    'prevaciado': 'master_id_prevaciado',
+    'inspeccion_final': 'master_id_inspeccion_final',
+}
 
 def _log_timing(label, start, extra=""):
     try:
@@ -36,6 +59,13 @@ class MrpPedidoOriginal(models.Model):
         store=False,
         readonly=True,
     )
+    line_ids = fields.One2many("mrp.master.order.line", "pedido_original_id", string="Líneas", readonly=True)
+    master_order_count = fields.Integer(
+        "# Órdenes maestras",
+        compute="_compute_master_order_count",
+        store=True,
+        readonly=True,
+    )
 
     _sql_constraints = [
         ("pedido_original_unique", "unique(name)", "El 'Pedido original' ya existe.")
@@ -47,32 +77,72 @@ class MrpPedidoOriginal(models.Model):
             if rec.name and not rec.name.startswith("PED-"):
                 raise ValidationError(_("El 'Pedido original' debe iniciar con 'PED-'."))
 
+    @api.model
+    def _get_or_create_name_map(self, names):
+        """Devuelve {nombre: id} creando los pedidos que falten con un solo INSERT ... ON CONFLICT.
+
+        Seguro ante workers concurrentes: si otro proceso inserta el mismo nombre a la vez,
+        el conflicto se ignora y el id se recupera en la lectura final.
+        """
+        names = sorted({(n or '').strip() for n in names} - {''})
+        names = [n for n in names if n.startswith('PED-')]
+        if not names:
+            return {}
+        self.flush_model(['name'])
+        self.env.cr.execute(
+            """
+            INSERT INTO mrp_pedido_original (name, master_order_count, create_uid, create_date, write_uid, write_date)
+            SELECT n, 0, %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC')
+              FROM unnest(%s::varchar[]) AS n
+            ON CONFLICT (name) DO NOTHING
+            RETURNING id, name
+            """,
+            [self.env.uid, self.env.uid, names],
+        )
+        name_map = {name: pedido_id for pedido_id, name in self.env.cr.fetchall()}
+        missing = [n for n in names if n not in name_map]
+        if missing:
+            self.env.cr.execute(
+                "SELECT id, name FROM mrp_pedido_original WHERE name = ANY(%s)",
+                [missing],
+            )
+            name_map.update({name: pedido_id for pedido_id, name in self.env.cr.fetchall()})
+        return name_map
+
+    def _get_master_ids_map(self):
+        """{pedido_id: [master_ids]} con una sola consulta sobre las nueve FKs de la línea."""
+        result_map = {rec_id: [] for rec_id in self.ids}
+        pedido_ids = tuple(rec_id for rec_id in result_map if isinstance(rec_id, int))
+        if not pedido_ids:
+            return result_map
+        self.env["mrp.master.order.line"].flush_model(["pedido_original_id", "active", *LINE_PARENT_FIELDS])
+        parents = ", ".join(f"(l.{fname})" for fname in LINE_PARENT_FIELDS)
+        self.env.cr.execute(
+            f"""
+            SELECT l.pedido_original_id, array_agg(DISTINCT p.master_id ORDER BY p.master_id)
+              FROM mrp_master_order_line l
+             CROSS JOIN LATERAL (VALUES {parents}) AS p(master_id)
+             WHERE l.pedido_original_id IN %s
+               AND l.active
+               AND p.master_id IS NOT NULL
+             GROUP BY l.pedido_original_id
+            """,
+            [pedido_ids],
+        )
+        for pedido_id, master_ids in self.env.cr.fetchall():
+            result_map[pedido_id] = master_ids
+        return result_map
+
     def _compute_master_orders(self):
-        line_model = self.env["mrp.master.order.line"]
-        result_map = {rec.id: set() for rec in self}
-        if not result_map:
-            return
-        lines = line_model.search([("pedido_original_id", "in", list(result_map.keys()))])
-        for line in lines:
-            pedido_id = line.pedido_original_id.id
-            if not pedido_id:
-                continue
-            masters = [
-                getattr(line, "master_id", False),
-                getattr(line, "master_id_hp_t1", False),
-                getattr(line, "master_id_hp_t2", False),
-                getattr(line, "master_id_hg_t1", False),
-                getattr(line, "master_id_hg_t2", False),
-                getattr(line, "master_id_corte", False),
-                getattr(line, "master_id_ensamblado", False),
-                getattr(line, "master_id_prevaciado", False),
-                getattr(line, "master_id_inspeccion_final", False),
-            ]
-            for master in masters:
-                if master:
-                    result_map[pedido_id].add(master.id)
+        result_map = self._get_master_ids_map()
+        for rec in self:
+            rec.master_order_ids = [(6, 0, result_map.get(rec.id, []))]
+
+    @api.depends("line_ids.active", *(f"line_ids.{fname}" for fname in LINE_PARENT_FIELDS))
+    def _compute_master_order_count(self):
+        result_map = self._get_master_ids_map()
         for rec in self:
-            rec.master_order_ids = [(6, 0, list(result_map.get(rec.id, set())))]
+            rec.master_order_count = len(result_map.get(rec.id, []))
 
 class MrpMasterOrder(models.Model):
 
@@ -459,26 +529,39 @@ Tipos de operación disponibles:
         return new
 
     def _assign_code_on_confirm(self):
-        """Asignar el código maestro sólo al confirmar (si está vacío) usando el prefijo del Tipo."""
+        """Asignar el código maestro sólo al confirmar (si está vacío) usando la secuencia del Tipo.
+
+        Los números se reservan por lote (Tipo, etapa) con nextval, sin escribir sobre
+        la fila de mrp.master.type, por lo que confirmaciones simultáneas no colisionan.
+        """
+        pending = defaultdict(list)
         for rec in self:
             if rec.name:
                 continue
-            try:
-                if rec.stage_type == 'opt' and hasattr(rec.type_id, 'get_opt_formatted_code'):
-                    rec.name = rec.type_id.get_opt_formatted_code()
-                else:
-                    rec.name = rec.type_id.get_formatted_code()
-            except Exception:
-                # Fallback defensivo
-                padding = int(self.env['ir.config_parameter'].sudo().get_param('mrp_master.code_padding', default='6'))
-                if rec.stage_type == 'opt':
-                    pref = (getattr(rec.type_id, 'opt_prefix', False) or rec.type_id.prefix or 'OPT').strip()
+            if rec.type_id:
+                pending[(rec.type_id, rec.stage_type)].append(rec)
+            else:
+                rec.name = rec._get_fallback_code()
+        for (master_type, stage_type), records in pending.items():
+            numbers = master_type._allocate_code_numbers(stage_type, len(records))
+            for rec, number in zip(records, numbers):
+                if stage_type == 'opt':
+                    rec.name = master_type.get_opt_formatted_code(number)
                 else:
-                    pref = (rec.type_id.prefix or 'OC').strip()
-                if not pref.endswith('-'):
-                    pref += '-'
-                seq_val = (rec.type_id.opt_next_number if rec.stage_type == 'opt' else rec.type_id.next_number) or 1
-                rec.name = f"{pref}{str(seq_val).zfill(padding)}"
+                    rec.name = master_type.get_formatted_code(number)
+
+    def _get_fallback_code(self):
+        """Código de respaldo (sin Tipo): prefijo por etapa y el contador del Tipo o 1."""
+        self.ensure_one()
+        padding = int(self.env['ir.config_parameter'].sudo().get_param('mrp_master.code_padding', default='6'))
+        if self.stage_type == 'opt':
+            pref = (getattr(self.type_id, 'opt_prefix', False) or self.type_id.prefix or 'OPT').strip()
+        else:
+            pref = (self.type_id.prefix or 'OC').strip()
+        if not pref.endswith('-'):
+            pref += '-'
+        seq_val = (self.type_id.opt_next_number if self.stage_type == 'opt' else self.type_id.next_number) or 1
+        return f"{pref}{str(seq_val).zfill(padding)}"
 
     _name = "mrp.master.order"
     _description = "Orden Maestra de Producción"
@@ -543,7 +626,8 @@ Tipos de operación disponibles:
 
     line_ids = fields.One2many("mrp.master.order.line", "master_id", string="Líneas")
     production_ids = fields.One2many("mrp.production", "master_order_id", string="Órdenes de fabricación generadas", readonly=True)
-    production_count = fields.Integer("# MOs", compute="_compute_production_count")
+    production_count = fields.Integer("# MOs", compute="_compute_production_count", store=True)
+    workorder_count = fields.Integer("# WOs", compute="_compute_production_count", store=True)
     delivery_picking_ids = fields.Many2many(
         "stock.picking",
         "mrp_master_order_delivery_rel",
@@ -635,8 +719,9 @@ Tipos de operación disponibles:
         res = super().write(vals)
         # Si se guardaron cambios, reseteamos la bandera de edición manual.
         # Esto permite que el próximo recálculo se ejecute si el usuario así lo desea.
-        if self.x_has_manual_changes:
-            super(MrpMasterOrder, self).write({'x_has_manual_changes': False})
+        flagged = self.filtered('x_has_manual_changes')
+        if flagged:
+            super(MrpMasterOrder, flagged).write({'x_has_manual_changes': False})
         return res
 
     @api.onchange('type_id')
@@ -650,20 +735,31 @@ Tipos de operación disponibles:
             if rec.name and '-' not in rec.name:
                 raise ValidationError(_('El código maestro debe tener un guion. Ej.: OCP-000123.'))
 
+    @api.depends('production_ids', 'production_ids.workorder_ids')
     def _compute_production_count(self):
+        """Contar MOs y WOs por el enlace indexado master_order_id (el origin de OPT es compuesto)."""
         start = time.perf_counter()
-        names = [rec.name for rec in self if rec.name]
+        master_ids = [rec.id for rec in self if isinstance(rec.id, int)]
         count_map = {}
-        if names:
-            grouped = self.env["mrp.production"].read_group(
-                [("origin", "in", list(set(names)))],
-                ["origin"],
-                ["origin"],
+        if master_ids:
+            self.env["mrp.production"].flush_model(["master_order_id"])
+            self.env["mrp.workorder"].flush_model(["production_id"])
+            self.env.cr.execute(
+                """
+                SELECT p.master_order_id, COUNT(DISTINCT p.id), COUNT(w.id)
+                  FROM mrp_production p
+             LEFT JOIN mrp_workorder w ON w.production_id = p.id
+                 WHERE p.master_order_id IN %s
+              GROUP BY p.master_order_id
+                """,
+                [tuple(master_ids)],
             )
-            count_map = {g.get("origin"): g.get("__count", 0) for g in grouped if g.get("origin")}
+            count_map = {row[0]: (row[1], row[2]) for row in self.env.cr.fetchall()}
         for rec in self:
-            rec.production_count = count_map.get(rec.name, 0)
-        _log_timing("mrp.master.order._compute_production_count", start, f"ids={self.ids} names={len(names)}")
+            mo_count, wo_count = count_map.get(rec.id, (0, 0))
+            rec.production_count = mo_count
+            rec.workorder_count = wo_count
+        _log_timing("mrp.master.order._compute_production_count", start, f"ids={self.ids}")
 
     @api.depends('delivery_picking_ids')
     def _compute_delivery_picking_count(self):
@@ -675,7 +771,7 @@ Tipos de operación disponibles:
     def action_view_productions(self):
         self.ensure_one()
         action = self.env.ref("mrp.mrp_production_action").sudo().read()[0]
-        action["domain"] = [("origin", "=", self.name)]
+        action["domain"] = [("master_order_id", "=", self.id)]
         action["context"] = {"search_default_groupby_product": 1}
         return action
 
@@ -702,23 +798,17 @@ Tipos de operación disponibles:
         return True
 
     def action_open_lines_tab(self):
+        """Abrir la pestaña como lista paginada: solo se leen las líneas de la página visible."""
         self.ensure_one()
         tab = (self.env.context or {}).get('mrp_tab')
-        domain = []
         name = _("Lineas")
-        field_map = {
-            'hp_t1': 'master_id_hp_t1',
-            'hp_t2': 'master_id_hp_t2',
-            'hg_t1': 'master_id_hg_t1',
-            'hg_t2': 'master_id_hg_t2',
-            'corte': 'master_id_corte',
-            'ensamblado': 'master_id_ensamblado',
-            'prevaciado': 'master_id_prevaciado',
-            'inspeccion_final': 'master_id_inspeccion_final',
-        }
-        field_name = field_map.get(tab, 'master_id')
+        field_name = TAB_PARENT_FIELDS.get(tab, 'master_id')
         domain = [(field_name, '=', self.id)]
         view_id = self.env.ref('alterben_mrp_master_order.view_mrp_master_order_line_tree_tab').id
+        try:
+            page_size = int(self.env['ir.config_parameter'].sudo().get_param('mrp_master.tab_page_size', default='80'))
+        except (TypeError, ValueError):
+            page_size = 80
         return {
             'type': 'ir.actions.act_window',
             'name': name,
@@ -727,6 +817,7 @@ Tipos de operación disponibles:
             'views': [(view_id, 'tree'), (False, 'form')],
             'target': 'current',
             'domain': domain,
+            'limit': max(page_size, 1),
             'context': {
                 'sum_exclude_canceled': True,
                 'mrp_tab': tab,
@@ -947,6 +1038,22 @@ Tipos de operación disponibles:
             for line in lines.filtered(lambda l: l.product_id and l.product_id.id in product_set):
                 planned[line.product_id.id] += (line.product_qty or 0.0)
                 real[line.product_id.id] += line.cantidad_real or 0.0
+        # Órdenes archivadas: se usan sus totales resumidos en lugar de las líneas.
+        summary_domain = [
+            ('stage_type', '=', stage_type),
+            ('master_state', '!=', 'cancel'),
+            ('master_id', '!=', self.id),
+            ('product_id', 'in', list(product_set)),
+        ]
+        if self.date_planned:
+            summary_domain.append(('date_planned', '<', self.date_planned))
+        summary_groups = self.env['mrp.master.order.archive.summary'].sudo().read_group(
+            summary_domain, ['planned_qty:sum', 'real_qty:sum'], ['product_id'],
+        )
+        for group in summary_groups:
+            pid = group['product_id'][0]
+            planned[pid] += group['planned_qty'] or 0.0
+            real[pid] += group['real_qty'] or 0.0
         result = {}
         for pid, qty in planned.items():
             diff = qty - real.get(pid, 0.0)
@@ -981,58 +1088,6 @@ Tipos de operación disponibles:
         action["context"] = {"search_default_groupby_product": 1}
         return action
 
-    def action_export_xls_tab(self):
-        self.ensure_one()
-        tab = (self.env.context or {}).get('mrp_tab')
-        fields = self._get_export_tab_fields(tab)
-        if not fields:
-            raise UserError(_("No se pudo determinar las columnas para exportar."))
-        lines = self._get_lines_by_tab(self, tab)
-        if not lines:
-            raise UserError(_("No hay líneas para exportar en esta pestaña."))
-
-        try:
-            import xlsxwriter  # type: ignore
-        except Exception:
-            try:
-                from odoo.tools.misc import xlsxwriter  # type: ignore
-            except Exception:
-                raise UserError(_("No se puede exportar a XLS porque falta la librería Python 'xlsxwriter' en el servidor."))
-
-        field_info = self.env["mrp.master.order.line"].fields_get(fields)
-        headers = [field_info[name]["string"] for name in fields]
-        data = lines.export_data(fields)["datas"]
-
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {"in_memory": True})
-        sheet_name = self._get_export_tab_label(tab)[:31] or "XLS"
-        sheet = workbook.add_worksheet(sheet_name)
-        header_format = workbook.add_format({"bold": True})
-        for col_idx, header in enumerate(headers):
-            sheet.write(0, col_idx, header, header_format)
-        for row_idx, row in enumerate(data, start=1):
-            for col_idx, value in enumerate(row):
-                sheet.write(row_idx, col_idx, value if value is not None else "")
-        workbook.close()
-        output.seek(0)
-
-        safe_name = re.sub(r"[^A-Za-z0-9_-]+", "_", self.name or "orden").strip("_") or "orden"
-        safe_label = re.sub(r"[^A-Za-z0-9_-]+", "_", self._get_export_tab_label(tab)).strip("_") or "lineas"
-        filename = f"{safe_name}_{safe_label}.xlsx"
-        attachment = self.env["ir.attachment"].create({
-            "name": filename,
-            "type": "binary",
-            "datas": base64.b64encode(output.read()),
-            "mimetype": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            "res_model": self._name,
-            "res_id": self.id,
-        })
-        return {
-            "type": "ir.actions.act_url",
-            "url": "/web/content/%s?download=true" % attachment.id,
-            "target": "self",
-        }
-
     def action_view_wos_tab(self):
         self.ensure_one()
         tab = self.env.context.get('mrp_tab')
@@ -1059,14 +1114,6 @@ Tipos de operación disponibles:
             'context': ctx,
             'order': order,
         }
-    def _increment_type_sequence(self):
-        for rec in self:
-            t = rec.type_id
-            if rec.stage_type == 'opt' and 'opt_next_number' in t._fields:
-                t.sudo().write({"opt_next_number": t.opt_next_number + 1})
-            else:
-                t.sudo().write({"next_number": t.next_number + 1})
-
     def _find_bom(self, product, company_id):
         Bom = self.env["mrp.bom"]
         try:
@@ -1144,7 +1191,6 @@ Tipos de operación disponibles:
             if errors:
                 raise ValidationError("\n".join(errors))
             rec.state = "confirmed"
-            rec._increment_type_sequence()
             rec._sync_opt_production_links()
         return True
 
@@ -1364,7 +1410,7 @@ class MrpMasterOrderLine(models.Model):
     available_product_ids = fields.Many2many('product.product', string='Productos disponibles', compute='_compute_available_products', store=False)
     available_pedido_ids = fields.Many2many('mrp.pedido.original', string='Pedidos disponibles', compute='_compute_available_pedidos', store=False)
     pedido_create_allowed = fields.Boolean(string="Permitir crear pedido", compute="_compute_pedido_create_allowed", store=False)
-    display_index = fields.Integer("N", compute="_compute_display_index", store=False)
+    display_index = fields.Integer("N", compute="_compute_display_index", store=True)
 
     @api.depends('type_id')
     def _compute_available_products(self):
@@ -1560,23 +1606,89 @@ class MrpMasterOrderLine(models.Model):
 
 
     @api.depends(
-        'sequence',
+        'sequence', 'product_id',
         'master_id', 'master_id_hp_t1', 'master_id_hp_t2', 'master_id_hg_t1', 'master_id_hg_t2',
-        'master_id_corte', 'master_id_ensamblado', 'master_id_prevaciado', 'master_id_inspeccion_final'
+        'master_id_corte', 'master_id_ensamblado', 'master_id_prevaciado', 'master_id_inspeccion_final',
+        'master_id.line_ids.sequence',
+        'master_id_hp_t1.line_ids_hp_t1.sequence',
+        'master_id_hp_t2.line_ids_hp_t2.sequence',
+        'master_id_hg_t1.line_ids_hg_t1.sequence',
+        'master_id_hg_t2.line_ids_hg_t2.sequence',
+        'master_id_corte.line_ids_corte.sequence',
+        'master_id_ensamblado.line_ids_ensamblado.sequence',
+        'master_id_prevaciado.line_ids_prevaciado.sequence',
+        'master_id_inspeccion_final.line_ids_inspeccion_final.sequence',
+        'master_id_ensamblado.line_ids_ensamblado.product_id',
+        'master_id_prevaciado.line_ids_prevaciado.product_id',
+        'master_id_inspeccion_final.line_ids_inspeccion_final.product_id',
     )
     def _compute_display_index(self):
-        """Numerar filas en las grillas de manera consecutiva, independiente del campo sequence."""
-        parent_map = {}
+        """Numerar filas por pestaña y marcar duplicados con una sola consulta (ROW_NUMBER/COUNT)."""
+        start = time.perf_counter()
+        parent_ids = set()
+        new_lines = self.browse()
         for line in self:
-            parent = (
-                line.master_id or line.master_id_hp_t1 or line.master_id_hp_t2 or
-                line.master_id_hg_t1 or line.master_id_hg_t2 or line.master_id_corte or
-                line.master_id_ensamblado or line.master_id_prevaciado or line.master_id_inspeccion_final
-            )
-            parent_map.setdefault(parent.id if parent else 0, []).append(line)
-        for lines in parent_map.values():
-            for idx, l in enumerate(sorted(lines, key=lambda r: (r.sequence or 0, r.id or 0)), start=1):
-                l.display_index = idx
+            line.display_index = 0
+            line.duplicate_in_tab = False
+            parent_field = next((fname for fname in LINE_PARENT_FIELDS if line[fname]), None)
+            if not parent_field:
+                continue
+            parent_id = line[parent_field].id
+            if isinstance(line.id, int) and isinstance(parent_id, int):
+                parent_ids.add(parent_id)
+            else:
+                new_lines |= line
+        if new_lines:
+            new_lines._compute_display_index_in_memory()
+        if not parent_ids:
+            return
+        self.flush_model(['sequence', 'product_id'] + list(LINE_PARENT_FIELDS))
+        parent_expr = "COALESCE(%s)" % ", ".join(LINE_PARENT_FIELDS)
+        slot_expr = "CASE %s END" % " ".join(
+            "WHEN %s IS NOT NULL THEN '%s'" % (fname, fname) for fname in LINE_PARENT_FIELDS
+        )
+        where_expr = " OR ".join("%s IN %%s" % fname for fname in LINE_PARENT_FIELDS)
+        self.env.cr.execute(
+            f"""
+            SELECT id,
+                   ROW_NUMBER() OVER (PARTITION BY parent_id, slot ORDER BY COALESCE(sequence, 0), id),
+                   CASE WHEN product_id IS NOT NULL AND slot IN %s
+                        THEN COUNT(*) OVER (PARTITION BY parent_id, slot, product_id)
+                        ELSE 0 END
+              FROM (SELECT id, sequence, product_id,
+                           {parent_expr} AS parent_id,
+                           {slot_expr} AS slot
+                      FROM mrp_master_order_line
+                     WHERE {where_expr}) sub
+            """,
+            [DUPLICATE_CHECK_PARENT_FIELDS] + [tuple(parent_ids)] * len(LINE_PARENT_FIELDS),
+        )
+        position_map = {row[0]: (row[1], row[2]) for row in self.env.cr.fetchall()}
+        for line in self:
+            index, product_count = position_map.get(line.id, (0, 0))
+            line.display_index = index
+            line.duplicate_in_tab = product_count > 1
+        _log_timing("mrp.master.order.line._compute_display_index", start, f"lines={len(self)}")
+
+    def _compute_display_index_in_memory(self):
+        """Numeración y duplicados sobre la caché: en el onchange del formulario las líneas
+        (o la orden) todavía son NewId y no existen en la base de datos."""
+        groups = defaultdict(lambda: self.browse())
+        for line in self:
+            parent_field = next(fname for fname in LINE_PARENT_FIELDS if line[fname])
+            groups[(parent_field, line[parent_field])] |= line
+        for (parent_field, parent), lines in groups.items():
+            siblings = parent[parent_field.replace('master_id', 'line_ids', 1)] | lines
+            ordered = siblings.sorted(lambda l: (l.sequence or 0, l._origin.id or 0))
+            position = {sibling: idx for idx, sibling in enumerate(ordered, start=1)}
+            counts = defaultdict(int)
+            if parent_field in DUPLICATE_CHECK_PARENT_FIELDS:
+                for sibling in siblings:
+                    if sibling.product_id:
+                        counts[sibling.product_id.id] += 1
+            for line in lines:
+                line.display_index = position.get(line, 0)
+                line.duplicate_in_tab = bool(line.product_id and counts[line.product_id.id] > 1)
 
     tipo_pvb = fields.Char("Tipo PVB", compute="_compute_pvb_data", store=True)
     ancho_pvb = fields.Char("Ancho", compute="_compute_pvb_data", store=True)
@@ -1686,7 +1798,7 @@ class MrpMasterOrderLine(models.Model):
         readonly=True,
         help="Piezas destruidas (se alimenta desde los desechos registrados).",
     )
-    duplicate_in_tab = fields.Boolean("Duplicado en pestaña", compute="_compute_duplicate_in_tab", store=False)
+    duplicate_in_tab = fields.Boolean("Duplicado en pestaña", compute="_compute_display_index", store=True)
     vitrificacion_ok = fields.Boolean("Vitrificación", help="Marcar si presenta vitrificación.")
     product_code = fields.Char("Código", compute="_compute_product_code", store=True)
     largo = fields.Float("Largo")
@@ -1697,28 +1809,49 @@ class MrpMasterOrderLine(models.Model):
     added_from_open_mo = fields.Boolean("Agregado desde MO abierta", default=False)
     origin_before_add = fields.Char("Origen anterior")
 
+    @api.model
+    def _get_active_production_ids(self, productions):
+        """Devuelve los ids de MOs con actividad (en progreso/hecha, WOs producidas o movimientos hechos)."""
+        prod_ids = tuple(productions.ids)
+        if not prod_ids:
+            return set()
+        self.env["mrp.production"].flush_model(["state"])
+        self.env["mrp.workorder"].flush_model(["production_id", "state", "qty_produced"])
+        self.env["stock.move"].flush_model([
+            "production_id", "raw_material_production_id", "state", "quantity", "product_uom_qty",
+        ])
+        self.env.cr.execute(
+            """
+            SELECT p.id
+              FROM mrp_production p
+             WHERE p.id IN %s
+               AND (p.state IN ('progress', 'done')
+                    OR EXISTS (SELECT 1
+                                 FROM mrp_workorder w
+                                WHERE w.production_id = p.id
+                                  AND (COALESCE(w.qty_produced, 0) <> 0 OR w.state IN ('progress', 'done')))
+                    OR EXISTS (SELECT 1
+                                 FROM stock_move m
+                                WHERE (m.production_id = p.id OR m.raw_material_production_id = p.id)
+                                  AND m.state = 'done'
+                                  AND (COALESCE(m.quantity, 0) <> 0 OR COALESCE(m.product_uom_qty, 0) <> 0)))
+            """,
+            [prod_ids],
+        )
+        return {row[0] for row in self.env.cr.fetchall()}
+
     def _mo_has_activity(self, production):
         if not production:
             return False
-        if getattr(production, "state", "") in ("progress", "done"):
-            return True
-        for wo in getattr(production, "workorder_ids", self.env["mrp.workorder"]):
-            if getattr(wo, "qty_produced", 0) or getattr(wo, "state", "") in ("progress", "done"):
-                return True
-        for mv in getattr(production, "move_finished_ids", self.env["stock.move"]):
-            if mv.state == "done" and (getattr(mv, "quantity_done", 0) or getattr(mv, "product_uom_qty", 0)):
-                return True
-        for mv in getattr(production, "move_raw_ids", self.env["stock.move"]):
-            if mv.state == "done" and (getattr(mv, "quantity_done", 0) or getattr(mv, "product_uom_qty", 0)):
-                return True
-        return False
+        return production.id in self._get_active_production_ids(production)
 
     def unlink(self):
         masters = self._get_related_masters()
-        for line in self:
-            if not (line.added_from_open_mo and line.production_id):
-                continue
-            if self._mo_has_activity(line.production_id):
+        open_mo_lines = self.filtered(lambda l: l.added_from_open_mo and l.production_id)
+        active_ids = self._get_active_production_ids(open_mo_lines.production_id)
+        restore_map = defaultdict(set)
+        for line in open_mo_lines:
+            if line.production_id.id in active_ids:
                 continue
             parent = line.master_id_ensamblado or line.master_id_prevaciado or line.master_id_inspeccion_final
             opt_name = parent.name if parent else False
@@ -1731,47 +1864,28 @@ class MrpMasterOrderLine(models.Model):
             else:
                 expected = opt_name or current
             if expected and current == expected:
-                try:
-                    line.production_id.write({"origin": before})
-                except Exception:
-                    pass
+                restore_map[before].add(line.production_id.id)
+        for before, prod_ids in restore_map.items():
+            try:
+                self.env["mrp.production"].browse(list(prod_ids)).write({"origin": before})
+            except Exception:
+                pass
         res = super().unlink()
-        if masters:
-            masters.with_context(skip_needs_refresh=True).write({'needs_refresh': True})
+        self.env['mrp.master.order.refresh.queue']._enqueue(masters.ids, mark_needs_refresh=True)
         return res
 
     def _get_related_masters(self):
         masters = self.env['mrp.master.order']
         for line in self:
-            for field_name in (
-                'master_id',
-                'master_id_hp_t1', 'master_id_hp_t2',
-                'master_id_hg_t1', 'master_id_hg_t2',
-                'master_id_corte', 'master_id_ensamblado',
-                'master_id_prevaciado', 'master_id_inspeccion_final',
-            ):
+            for field_name in LINE_PARENT_FIELDS:
                 master = getattr(line, field_name, False)
                 if master:
                     masters |= master
         return masters
 
-    def _mark_masters_needs_refresh(self):
-        if self.env.context.get('skip_needs_refresh'):
-            return
-        masters = self._get_related_masters()
-        if masters:
-            masters.with_context(skip_needs_refresh=True).write({'needs_refresh': True})
-
-    @api.model_create_multi
-    def create(self, vals_list):
-        records = super().create(vals_list)
-        records._mark_masters_needs_refresh()
-        return records
-
-    def write(self, vals):
-        res = super().write(vals)
-        self._mark_masters_needs_refresh()
-        return res
+    def _enqueue_master_totals(self):
+        """Encolar solo el recálculo de totales: editar una línea no marca la orden como pendiente."""
+        self.env['mrp.master.order.refresh.queue']._enqueue(self._get_related_masters().ids)
 
     def _suggest_cantidad_piezas(self, qty):
         if qty is None:
@@ -2035,12 +2149,29 @@ class MrpMasterOrderLine(models.Model):
         text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
         return text.lower()
 
-    def _get_stage_key_from_workorder(self, workorder):
+    def _get_workorder_stage_name(self, workorder):
         name = ''
         if workorder and workorder.workcenter_id:
             name = workorder.workcenter_id.name or ''
         if not name and workorder and workorder.operation_id:
             name = workorder.operation_id.name or ''
+        return name
+
+    def _get_stage_key_from_workorder(self, workorder):
+        return self._get_stage_key_from_name(self._get_workorder_stage_name(workorder))
+
+    def _get_stage_key_map(self, workorders):
+        """{wo.id: etapa} normalizando cada nombre de centro/operación una sola vez."""
+        stage_by_name = {}
+        result = {}
+        for wo in workorders:
+            name = self._get_workorder_stage_name(wo)
+            if name not in stage_by_name:
+                stage_by_name[name] = self._get_stage_key_from_name(name)
+            result[wo.id] = stage_by_name[name]
+        return result
+
+    def _get_stage_key_from_name(self, name):
         name = self._normalize_workcenter_name(name)
         if 'ensambl' in name:
             return 'ensamblado'
@@ -2062,12 +2193,13 @@ class MrpMasterOrderLine(models.Model):
         if 'state' in Scrap._fields:
             domain = [('state', '!=', 'cancel')] + domain
         scrap_records = Scrap.search(domain)
+        stage_by_wo = self._get_stage_key_map(workorders)
         for sc in scrap_records:
             wo = sc.workorder_id
             prod = wo.production_id if wo else sc.production_id
             if not prod or prod.id not in result:
                 continue
-            stage = self._get_stage_key_from_workorder(wo)
+            stage = stage_by_wo.get(wo.id) if wo else False
             if not stage:
                 continue
             if sc.product_id and prod.product_id and sc.product_id.id != prod.product_id.id:
@@ -2120,32 +2252,48 @@ class MrpMasterOrderLine(models.Model):
             lines._compute_station_quantities()
 
     def _sync_workorder_qty_producing(self, productions, line_by_production=None):
+        """Sincronizar qty_producing de las WOs con un mapa (MO, etapa) y escrituras agrupadas.
+
+        Solo se escriben las WOs cuyo valor cambia, con una escritura por cantidad distinta.
+        """
         prods = productions.filtered(lambda p: p)
         if not prods:
             return
         if line_by_production is None:
             line_by_production = {line.production_id.id: line for line in self if line.production_id}
         workorders = prods.workorder_ids
-        if not workorders:
+        if not workorders or 'qty_producing' not in workorders._fields:
             return
+        start = time.perf_counter()
+        stage_by_wo = self._get_stage_key_map(workorders)
+        wos_by_key = defaultdict(list)
         for wo in workorders:
-            line = line_by_production.get(wo.production_id.id)
+            stage = stage_by_wo.get(wo.id)
+            if stage:
+                wos_by_key[(wo.production_id.id, stage)].append(wo)
+        wo_ids_by_qty = defaultdict(list)
+        for (production_id, stage), stage_wos in wos_by_key.items():
+            line = line_by_production.get(production_id)
             if not line:
                 continue
-            stage = self._get_stage_key_from_workorder(wo)
             if stage == 'ensamblado':
                 qty = line.cantidad_ensamblada or 0.0
             elif stage == 'prevaciado':
                 qty = line.qty_to_prevaciar or 0.0
-            elif stage == 'inspeccion_final':
-                qty = line.qty_to_liberar or 0.0
             else:
-                continue
-            vals = {}
-            if 'qty_producing' in wo._fields:
-                vals['qty_producing'] = qty
-            if vals:
-                wo.with_context(skip_opt_qty_sync=True).write(vals)
+                qty = line.qty_to_liberar or 0.0
+            rounding = line.production_id.product_uom_id.rounding or 0.01
+            for wo in stage_wos:
+                if float_compare(wo.qty_producing or 0.0, qty, precision_rounding=rounding) != 0:
+                    wo_ids_by_qty[qty].append(wo.id)
+        Workorder = self.env['mrp.workorder'].with_context(skip_opt_qty_sync=True)
+        for qty, wo_ids in wo_ids_by_qty.items():
+            Workorder.browse(wo_ids).write({'qty_producing': qty})
+        _log_timing(
+            "mrp.master.order.line._sync_workorder_qty_producing",
+            start,
+            f"wos={len(workorders)} written={sum(len(ids) for ids in wo_ids_by_qty.values())}",
+        )
 
     @api.depends(
         'cantidad_ensamblada',
@@ -2193,54 +2341,6 @@ class MrpMasterOrderLine(models.Model):
             code = (line.product_id.default_code or '').strip()
             line.product_code = line._extract_code_suffix(code) if code else False
 
-    @api.depends(
-        'product_id',
-        'master_id_ensamblado', 'master_id_prevaciado', 'master_id_inspeccion_final',
-        'master_id_ensamblado.line_ids_ensamblado.product_id',
-        'master_id_prevaciado.line_ids_prevaciado.product_id',
-        'master_id_inspeccion_final.line_ids_inspeccion_final.product_id',
-    )
-    def _compute_duplicate_in_tab(self):
-        parent_map = {}
-        for line in self:
-            parent = line.master_id_ensamblado or line.master_id_prevaciado or line.master_id_inspeccion_final
-            if not parent:
-                line.duplicate_in_tab = False
-                continue
-            if line.master_id_ensamblado:
-                tab = "ensamblado"
-            elif line.master_id_prevaciado:
-                tab = "prevaciado"
-            else:
-                tab = "inspeccion_final"
-            key = (parent.id, tab)
-            if key not in parent_map:
-                parent_map[key] = {
-                    "parent": parent,
-                    "tab": tab,
-                    "lines": self.env['mrp.master.order.line'],
-                }
-            parent_map[key]["lines"] |= line
-
-        for data in parent_map.values():
-            parent = data["parent"]
-            tab = data["tab"]
-            if tab == "ensamblado":
-                lines = parent.line_ids_ensamblado
-            elif tab == "prevaciado":
-                lines = parent.line_ids_prevaciado
-            else:
-                lines = parent.line_ids_inspeccion_final
-            counts = {}
-            for l in lines:
-                pid = l.product_id.id if l.product_id else False
-                if not pid:
-                    continue
-                counts[pid] = counts.get(pid, 0) + 1
-            for line in data["lines"]:
-                pid = line.product_id.id if line.product_id else False
-                line.duplicate_in_tab = bool(pid and counts.get(pid, 0) > 1)
-
     def action_open_add_open_mo_wizard_line(self):
         """
         Abre el wizard para agregar MOs abiertas a la orden maestra.
@@ -2711,10 +2811,16 @@ class MrpMasterOrderLine(models.Model):
 
         days = self._get_pedido_lookup_days()
         cutoff = fields.Datetime.now() - timedelta(days=days)
+        # Prefiltro por 'PED-' y por el bloque más largo del sufijo (servido por los índices
+        # trigram de origin y default_code). _extract_code_suffix recorta espacios y bloques
+        # vacíos, así que un código como 'X - ABC - T1' no termina literalmente en 'ABC-T1',
+        # pero cada bloque sí aparece tal cual: el prefiltro no descarta candidatos válidos.
+        longest_part = max(target_suffix.split('-'), key=len)
         mos = Production.search([
             ('state', '!=', 'cancel'),
-            ('origin', '!=', False),
+            ('origin', 'ilike', 'PED-'),
             ('date_start', '>=', cutoff),
+            ('product_id.default_code', 'ilike', longest_part),
         ])
         names = set()
         for mo in mos:
@@ -2767,7 +2873,9 @@ class MrpMasterOrderLine(models.Model):
             vals['pvb_cortado_qty'] = suggested if suggested is not False else self._suggest_cantidad_piezas(qty)
         if 'pvb_cortado_text' not in vals:
             vals['pvb_cortado_text'] = self._format_qty_display(vals.get('pvb_cortado_qty') or 0.0)
-        return super().create(vals)
+        record = super().create(vals)
+        record._enqueue_master_totals()
+        return record
 
     def write(self, vals):
         is_auto = self.env.context.get('auto_station_qty')
@@ -2807,6 +2915,7 @@ class MrpMasterOrderLine(models.Model):
             if any(k in vals for k in ('cantidad_ensamblada', 'qty_to_prevaciar', 'qty_to_liberar', 'production_id')):
                 productions = self.mapped('production_id')
                 self.env['mrp.master.order.line']._recompute_station_qty_for_productions(productions)
+        self._enqueue_master_totals()
         return res
 
     def _normalize_op_text(self, text):
@@ -2880,22 +2989,25 @@ class MrpMasterOrderLine(models.Model):
             lines._compute_scrap_qty()
             lines._compute_station_quantities()
             lines._compute_cantidad_real()
+            lines._enqueue_master_totals()
     
 class MrpProduction(models.Model):
     _inherit = "mrp.production"
 
     master_order_id = fields.Many2one("mrp.master.order", string="Orden Maestra", index=True, readonly=True)
 
+    def init(self):
+        super().init()
+        # Recorrido por bloques (write_date, id) de cron_sync_pedidos_originales_mes.
+        sql.create_index(self.env.cr, "mrp_production_write_date_id_idx", self._table, ["write_date", "id"])
+
     def _sync_pedido_original_catalog(self):
+        """Registra en el catálogo los 'PED-...' de las MOs; devuelve {nombre: id de pedido}."""
         if "x_studio_pedido_original" not in self._fields:
-            return
-        Pedido = self.env["mrp.pedido.original"].sudo()
-        for rec in self:
-            name = (getattr(rec, 'x_studio_pedido_original', False) or '').strip()
-            if name and name.startswith('PED-'):
-                exists = Pedido.search([('name', '=', name)], limit=1)
-                if not exists:
-                    Pedido.create({'name': name})
+            return {}
+        return self.env["mrp.pedido.original"].sudo()._get_or_create_name_map(
+            self.mapped("x_studio_pedido_original")
+        )
 
     @api.model_create_multi
     def create(self, vals_list):
@@ -2907,36 +3019,110 @@ class MrpProduction(models.Model):
         return recs
 
     @api.model
-    def cron_sync_pedidos_originales_mes(self):
-        if "x_studio_pedido_original" not in self._fields:
-            return True
-        today = fields.Date.context_today(self)
-        start = today.replace(day=1)
-        # compute next month start
-        if start.month == 12:
-            next_month_start = start.replace(year=start.year + 1, month=1, day=1)
-        else:
-            next_month_start = start.replace(month=start.month + 1, day=1)
-        domain = [
-            ("date_start", ">=", fields.Datetime.to_datetime(start)),
-            ("date_start", "<", fields.Datetime.to_datetime(next_month_start)),
-            ("x_studio_pedido_original", "ilike", "PED-"),
-        ]
+    def _get_pedido_sync_watermark(self):
+        # Lectura directa: get_param está en ormcache y la marca se escribe sin invalidarlo.
+        self.env.cr.execute("SELECT value FROM ir_config_parameter WHERE key = %s", [PEDIDO_SYNC_WATERMARK_PARAM])
+        row = self.env.cr.fetchone()
+        value = (row and row[0]) or ''
+        try:
+            stamp, last_id = value.rsplit('|', 1)
+            return datetime.fromisoformat(stamp), int(last_id)
+        except ValueError:
+            return None
+
+    @api.model
+    def _set_pedido_sync_watermark(self, write_date, last_id):
+        """Guarda la marca con un upsert SQL: set_param vacía la caché del registro en todos
+        los workers y el cron la escribe en cada bloque."""
+        value = f"{write_date.isoformat(sep=' ')}|{last_id}" if write_date else ''
+        self.env.cr.execute(
+            """
+            INSERT INTO ir_config_parameter (key, value, create_uid, create_date, write_uid, write_date)
+            VALUES (%s, %s, %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')
+            ON CONFLICT (key) DO UPDATE
+               SET value = EXCLUDED.value, write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+            """,
+            [PEDIDO_SYNC_WATERMARK_PARAM, value, self.env.uid, self.env.uid],
+        )
+
+    @api.model
+    def cron_sync_pedidos_originales_mes(self, full_rebuild=False):
+        """Sincroniza el catálogo de pedidos solo con las MOs modificadas desde la última ejecución.
+
+        Usa una marca (write_date, id) guardada en ir.config_parameter y procesa por bloques
+        con commit, releyendo PEDIDO_SYNC_SAFETY_WINDOW antes de la marca. Sin marca previa
+        arranca desde el inicio del mes actual; con full_rebuild=True recorre todas las MOs.
+        Devuelve el número de MOs procesadas.
+        """
+        field = self._fields.get("x_studio_pedido_original")
+        if not field or not field.store:
+            return 0
+        start_time = time.perf_counter()
+        watermark = None if full_rebuild else self._get_pedido_sync_watermark()
+        if watermark is None:
+            if full_rebuild:
+                watermark = (datetime.min, 0)
+            else:
+                month_start = fields.Date.context_today(self).replace(day=1)
+                watermark = (fields.Datetime.to_datetime(month_start), 0)
+        position = watermark
+        if watermark[0] > datetime.min + PEDIDO_SYNC_SAFETY_WINDOW:
+            position = (watermark[0] - PEDIDO_SYNC_SAFETY_WINDOW, 0)
         Pedido = self.env["mrp.pedido.original"].sudo()
-        mos = self.search(domain)
-        names = set()
-        for mo in mos:
-            name = (getattr(mo, 'x_studio_pedido_original', False) or '').strip()
-            if name and name.startswith('PED-'):
-                names.add(name)
-        if not names:
-            return True
-        existing = Pedido.search([('name', 'in', list(names))])
-        existing_names = set(existing.mapped('name'))
-        to_create = [{'name': n} for n in names - existing_names]
-        if to_create:
-            Pedido.create(to_create)
-        return True
+        commit = not self.env.registry.in_test_mode()
+        processed = 0
+        while True:
+            self.flush_model(["x_studio_pedido_original", "write_date"])
+            self.env.cr.execute(
+                """
+                SELECT id, write_date, TRIM(x_studio_pedido_original)
+                  FROM mrp_production
+                 WHERE TRIM(x_studio_pedido_original) LIKE 'PED-%%'
+                   AND (write_date, id) > (%s, %s)
+                 ORDER BY write_date, id
+                 LIMIT %s
+                """,
+                [position[0], position[1], PEDIDO_SYNC_CHUNK_SIZE],
+            )
+            rows = self.env.cr.fetchall()
+            if not rows:
+                break
+            processed += len(rows)
+            Pedido._get_or_create_name_map(name for _id, _date, name in rows)
+            position = (rows[-1][1], rows[-1][0])
+            if position > watermark:
+                watermark = position
+                self._set_pedido_sync_watermark(*watermark)
+            if commit:
+                self.env.cr.commit()
+            if len(rows) < PEDIDO_SYNC_CHUNK_SIZE:
+                break
+        _logger.info(
+            "Sync pedidos originales: mos=%s full_rebuild=%s",
+            processed, bool(full_rebuild),
+        )
+        _log_timing("mrp.production.cron_sync_pedidos_originales_mes", start_time, f"mos={processed}")
+        return processed
+
+    @api.model
+    def action_request_pedido_full_rebuild(self):
+        """Reconstrucción completa en segundo plano: reinicia la marca y dispara el cron.
+
+        El cron recorre todas las MOs por bloques con commit y, si se interrumpe, continúa
+        desde el último bloque guardado en lugar de empezar de nuevo.
+        """
+        self._set_pedido_sync_watermark(datetime.min, 0)
+        self.env.ref("alterben_mrp_master_order.ir_cron_sync_pedidos_originales_mes").sudo()._trigger()
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": _("Catálogo de pedidos"),
+                "message": _("La reconstrucción se ejecutará en segundo plano en unos minutos."),
+                "type": "info",
+                "sticky": False,
+            },
+        }
 
     def write(self, vals):
         res = super().write(vals)
@@ -16,47 +16,45 @@ class MrpMasterOrder(models.Model):
     )
 
     def _compute_ct_complete_master(self):
-        Label = self.env['control.total.label']
+        # Una sola consulta para todas las órdenes: evita cargar las líneas de Inspección final
+        # (y un search_count por línea) cada vez que se abre el formulario OPT.
+        order_ids = tuple(order.id for order in self if isinstance(order.id, int))
+        complete_map = {}
+        if order_ids:
+            self.env["mrp.master.order.line"].flush_model(
+                ["master_id_inspeccion_final", "qty_to_deliver", "ct_pre_from", "ct_pre_to"]
+            )
+            self.env["control.total.label"].flush_model(
+                ["name", "active", "master_order_id", "master_order_line_id"]
+            )
+            self.env.cr.execute(
+                """
+                SELECT l.master_id_inspeccion_final,
+                       BOOL_AND(
+                           TRUNC(COALESCE(l.qty_to_deliver, 0)) <= 0
+                           OR (
+                               COALESCE(l.ct_pre_from, '') != ''
+                               AND COALESCE(l.ct_pre_to, '') != ''
+                               AND (
+                                   SELECT COUNT(*)
+                                     FROM control_total_label c
+                                    WHERE c.active
+                                      AND (c.master_order_line_id = l.id
+                                           OR (c.master_order_id = l.master_id_inspeccion_final
+                                               AND c.name >= l.ct_pre_from
+                                               AND c.name <= l.ct_pre_to))
+                               ) >= TRUNC(COALESCE(l.qty_to_deliver, 0))
+                           )
+                       )
+                  FROM mrp_master_order_line l
+                 WHERE l.master_id_inspeccion_final IN %s
+                 GROUP BY l.master_id_inspeccion_final
+                """,
+                [order_ids],
+            )
+            complete_map = dict(self.env.cr.fetchall())
         for order in self:
-            lines = getattr(order, "line_ids_inspeccion_final", self.env["mrp.master.order.line"])
-            if not lines:
-                order.ct_complete_master = False
-                continue
-                
-            all_lines_complete = True
-            for line in lines:
-                deliver_qty = int(line.qty_to_deliver or 0)
-                if deliver_qty <= 0:
-                    continue
-                if not line.ct_pre_from or not line.ct_pre_to:
-                    all_lines_complete = False
-                    break
-                    
-                # Verificar si hay etiquetas activas para esta línea
-                domain = [
-                    '|',
-                    ('master_order_line_id', '=', line.id),
-                    '&',
-                    ('master_order_id', '=', order.id),
-                    '&',
-                    ('name', '>=', line.ct_pre_from),
-                    '&',
-                    ('name', '<=', line.ct_pre_to),
-                    ('active', '=', True)
-                ]
-                
-                label_count = Label.search_count(domain)
-                
-                if label_count == 0:
-                    all_lines_complete = False
-                    break
-                    
-                # Verificar que la cantidad de etiquetas coincida con la cantidad del producto
-                if label_count < deliver_qty:
-                    all_lines_complete = False
-                    break
-            
-            order.ct_complete_master = all_lines_complete
+            order.ct_complete_master = bool(complete_map.get(order.id, False))
 
     def _compute_ct_banner_master(self):
         for order in self:
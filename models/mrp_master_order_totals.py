@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import time
+
+from odoo import api, fields, models
+
+from .mrp_master_order import TAB_PARENT_FIELDS, _log_timing
+
+# Columna de la línea -> prefijo del total almacenado en la Orden Maestra.
+TAB_TOTAL_FIELDS = {
+    'product_qty': 'total_qty',
+    'cantidad_real': 'total_real',
+    'scrap_qty': 'total_scrap',
+    'pending_qty': 'total_pending',
+}
+TAB_TOTAL_FIELD_NAMES = tuple(
+    f"{prefix}_{tab}" for tab in TAB_PARENT_FIELDS for prefix in TAB_TOTAL_FIELDS.values()
+)
+
+
+class MrpMasterOrder(models.Model):
+    _inherit = "mrp.master.order"
+
+    # Totales por pestaña (excluyen líneas con MO cancelada, igual que sum_exclude_canceled).
+    # No dependen de las líneas: se refrescan desde mrp.master.order.refresh.queue para que
+    # editar una línea no bloquee la fila de la orden maestra.
+    total_qty_hp_t1 = fields.Float("Cant. HORNO P - T1", compute="_compute_tab_totals", store=True, readonly=True)
+    total_real_hp_t1 = fields.Float("Real HORNO P - T1", compute="_compute_tab_totals", store=True, readonly=True)
+    total_scrap_hp_t1 = fields.Float("Desechos HORNO P - T1", compute="_compute_tab_totals", store=True, readonly=True)
+    total_pending_hp_t1 = fields.Float("Pendiente HORNO P - T1", compute="_compute_tab_totals", store=True, readonly=True)
+    total_qty_hp_t2 = fields.Float("Cant. HORNO P - T2", compute="_compute_tab_totals", store=True, readonly=True)
+    total_real_hp_t2 = fields.Float("Real HORNO P - T2", compute="_compute_tab_totals", store=True, readonly=True)
+    total_scrap_hp_t2 = fields.Float("Desechos HORNO P - T2", compute="_compute_tab_totals", store=True, readonly=True)
+    total_pending_hp_t2 = fields.Float("Pendiente HORNO P - T2", compute="_compute_tab_totals", store=True, readonly=True)
+    total_qty_hg_t1 = fields.Float("Cant. HORNO G - T1", compute="_compute_tab_totals", store=True, readonly=True)
+    total_real_hg_t1 = fields.Float("Real HORNO G - T1", compute="_compute_tab_totals", store=True, readonly=True)
+    total_scrap_hg_t1 = fields.Float("Desechos HORNO G - T1", compute="_compute_tab_totals", store=True, readonly=True)
+    total_pending_hg_t1 = fields.Float("Pendiente HORNO G - T1", compute="_compute_tab_totals", store=True, readonly=True)
+    total_qty_hg_t2 = fields.Float("Cant. HORNO G - T2", compute="_compute_tab_totals", store=True, readonly=True)
+    total_real_hg_t2 = fields.Float("Real HORNO G - T2", compute="_compute_tab_totals", store=True, readonly=True)
+    total_scrap_hg_t2 = fields.Float("Desechos HORNO G - T2", compute="_compute_tab_totals", store=True, readonly=True)
+    total_pending_hg_t2 = fields.Float("Pendiente HORNO G - T2", compute="_compute_tab_totals", store=True, readonly=True)
+    total_qty_corte = fields.Float("Cant. CORTE PVB", compute="_compute_tab_totals", store=True, readonly=True)
+    total_real_corte = fields.Float("Real CORTE PVB", compute="_compute_tab_totals", store=True, readonly=True)
+    total_scrap_corte = fields.Float("Desechos CORTE PVB", compute="_compute_tab_totals", store=True, readonly=True)
+    total_pending_corte = fields.Float("Pendiente CORTE PVB", compute="_compute_tab_totals", store=True, readonly=True)
+    total_qty_ensamblado = fields.Float("Cant. ENSAMBLADO", compute="_compute_tab_totals", store=True, readonly=True)
+    total_real_ensamblado = fields.Float("Real ENSAMBLADO", compute="_compute_tab_totals", store=True, readonly=True)
+    total_scrap_ensamblado = fields.Float("Desechos ENSAMBLADO", compute="_compute_tab_totals", store=True, readonly=True)
+    total_pending_ensamblado = fields.Float("Pendiente ENSAMBLADO", compute="_compute_tab_totals", store=True, readonly=True)
+    total_qty_prevaciado = fields.Float("Cant. PREVACIADO Y LAMINADO", compute="_compute_tab_totals", store=True, readonly=True)
+    total_real_prevaciado = fields.Float("Real PREVACIADO Y LAMINADO", compute="_compute_tab_totals", store=True, readonly=True)
+    total_scrap_prevaciado = fields.Float("Desechos PREVACIADO Y LAMINADO", compute="_compute_tab_totals", store=True, readonly=True)
+    total_pending_prevaciado = fields.Float("Pendiente PREVACIADO Y LAMINADO", compute="_compute_tab_totals", store=True, readonly=True)
+    total_qty_inspeccion_final = fields.Float("Cant. INSPECCION FINAL", compute="_compute_tab_totals", store=True, readonly=True)
+    total_real_inspeccion_final = fields.Float("Real INSPECCION FINAL", compute="_compute_tab_totals", store=True, readonly=True)
+    total_scrap_inspeccion_final = fields.Float("Desechos INSPECCION FINAL", compute="_compute_tab_totals", store=True, readonly=True)
+    total_pending_inspeccion_final = fields.Float("Pendiente INSPECCION FINAL", compute="_compute_tab_totals", store=True, readonly=True)
+
+    def _refresh_tab_totals(self):
+        """Marcar los totales para recálculo y escribirlos en una sola actualización por orden."""
+        for fname in TAB_TOTAL_FIELD_NAMES:
+            self.env.add_to_compute(self._fields[fname], self)
+        self.flush_recordset(list(TAB_TOTAL_FIELD_NAMES))
+
+    @api.depends()
+    def _compute_tab_totals(self):
+        """Sumar las columnas de las ocho pestañas con un solo GROUP BY en SQL."""
+        start = time.perf_counter()
+        for rec in self:
+            for fname in TAB_TOTAL_FIELD_NAMES:
+                rec[fname] = 0.0
+        master_ids = tuple(rec.id for rec in self if isinstance(rec.id, int))
+        if not master_ids:
+            return
+        Line = self.env["mrp.master.order.line"]
+        Line.flush_model(list(TAB_TOTAL_FIELDS) + list(TAB_PARENT_FIELDS.values()) + ["production_id"])
+        self.env["mrp.production"].flush_model(["state"])
+        parent_expr = "COALESCE(%s)" % ", ".join("l.%s" % fname for fname in TAB_PARENT_FIELDS.values())
+        slot_expr = "CASE %s END" % " ".join(
+            "WHEN l.%s IS NOT NULL THEN '%s'" % (fname, tab) for tab, fname in TAB_PARENT_FIELDS.items()
+        )
+        where_expr = " OR ".join("l.%s IN %%s" % fname for fname in TAB_PARENT_FIELDS.values())
+        sums_expr = ", ".join("COALESCE(SUM(l.%s), 0)" % fname for fname in TAB_TOTAL_FIELDS)
+        self.env.cr.execute(
+            f"""
+            SELECT {parent_expr}, {slot_expr}, {sums_expr}
+              FROM mrp_master_order_line l
+              LEFT JOIN mrp_production p ON p.id = l.production_id
+             WHERE ({where_expr})
+               AND (l.production_id IS NULL OR p.state != 'cancel')
+             GROUP BY 1, 2
+            """,
+            [master_ids] * len(TAB_PARENT_FIELDS),
+        )
+        totals = {}
+        for master_id, tab, *sums in self.env.cr.fetchall():
+            totals[(master_id, tab)] = sums
+        for rec in self:
+            for tab in TAB_PARENT_FIELDS:
+                sums = totals.get((rec.id, tab))
+                if not sums:
+                    continue
+                for prefix, value in zip(TAB_TOTAL_FIELDS.values(), sums):
+                    rec[f"{prefix}_{tab}"] = value
+        _log_timing("mrp.master.order._compute_tab_totals", start, f"masters={len(self)}")
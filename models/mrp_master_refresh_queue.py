@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import time
+
+from odoo import api, fields, models
+
+from .mrp_master_order import _log_timing
+
+REFRESH_QUEUE_BATCH_SIZE = 500
+
+
+class MrpMasterOrderRefreshQueue(models.Model):
+    """Cola de banderas/agregados de la Orden Maestra.
+
+    Las ediciones de líneas solo insertan filas aquí (sin tocar la fila de la orden);
+    el cron las consume y escribe la orden maestra en una transacción aparte.
+    """
+
+    _name = "mrp.master.order.refresh.queue"
+    _description = "Cola de actualización de Órdenes Maestras"
+    _log_access = False
+    _order = "id"
+
+    master_id = fields.Many2one("mrp.master.order", "Orden Maestra", required=True, ondelete="cascade", index=True)
+    mark_needs_refresh = fields.Boolean("Marcar recálculo pendiente", default=False)
+    enqueued_at = fields.Datetime("Encolado", default=fields.Datetime.now)
+
+    @api.model
+    def _enqueue(self, master_ids, mark_needs_refresh=False):
+        ids = sorted({mid for mid in master_ids if isinstance(mid, int) and mid})
+        if not ids:
+            return
+        self.env.cr.execute(
+            """
+            INSERT INTO mrp_master_order_refresh_queue (master_id, mark_needs_refresh, enqueued_at)
+            SELECT unnest(%s::int[]), %s, clock_timestamp() AT TIME ZONE 'UTC'
+            """,
+            [ids, bool(mark_needs_refresh)],
+        )
+
+    @api.model
+    def _process_queue(self, limit=REFRESH_QUEUE_BATCH_SIZE):
+        """Consumir la cola: recalcular totales por pestaña y marcar needs_refresh una vez por orden.
+
+        Una marca encolada antes del último "Actualizar" de la orden (last_refresh_at) ya quedó
+        cubierta por ese refresco y se descarta, para no volver a marcar la orden recién actualizada.
+        """
+        start = time.perf_counter()
+        self.env.cr.execute(
+            """
+            DELETE FROM mrp_master_order_refresh_queue
+             WHERE id IN (
+                   SELECT id FROM mrp_master_order_refresh_queue
+                    ORDER BY id
+                    LIMIT %s
+                      FOR UPDATE SKIP LOCKED)
+            RETURNING master_id, mark_needs_refresh, enqueued_at
+            """,
+            [limit],
+        )
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return 0
+        last_mark = {}
+        for master_id, mark, enqueued_at in rows:
+            if mark and (master_id not in last_mark or enqueued_at > last_mark[master_id]):
+                last_mark[master_id] = enqueued_at
+        Master = self.env["mrp.master.order"].with_context(active_test=False)
+        masters = Master.browse(list({row[0] for row in rows})).exists()
+        if masters:
+            masters._refresh_tab_totals()
+            # last_refresh_at se guarda sin microsegundos: una marca del mismo segundo se da por cubierta.
+            to_flag = masters.filtered(
+                lambda m: m.id in last_mark
+                and not m.needs_refresh
+                and (not m.last_refresh_at or last_mark[m.id].replace(microsecond=0) > m.last_refresh_at)
+            )
+            if to_flag:
+                to_flag.with_context(skip_needs_refresh=True).write({'needs_refresh': True})
+        _log_timing("mrp.master.order.refresh.queue._process_queue", start, f"rows={len(rows)} masters={len(masters)}")
+        return len(rows)
+
+    @api.model
+    def cron_process_queue(self):
+        while self._process_queue() >= REFRESH_QUEUE_BATCH_SIZE:
+            continue
+        return True
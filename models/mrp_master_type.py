@@ -1,4 +1,32 @@
-from odoo import api, fields, models, _
+from collections import namedtuple
+
+from odoo import api, fields, models, tools, _
+from odoo.exceptions import ValidationError
+from odoo.tools.sql import column_exists
+
+CODE_SEQUENCE_FIELDS = {
+    'curvado_pvb': ('code_sequence_id', 'next_number'),
+    'opt': ('opt_code_sequence_id', 'opt_next_number'),
+}
+# Parametros de los reportes OPT (valores por defecto si no hay Tipo activo).
+ReportConfig = namedtuple('ReportConfig', [
+    'type_id', 'sales_days',
+    'units_small_8', 'units_small_12', 'units_large_8', 'units_large_12',
+    'base_items_small', 'base_items_large', 'max_mold_changes_small', 'max_mold_changes_large', 'excess_pct',
+    'categ_id', 'final_categ_id',
+])
+DEFAULT_REPORT_CONFIG = ReportConfig(
+    type_id=False, sales_days=30,
+    units_small_8=88, units_small_12=132, units_large_8=24, units_large_12=36,
+    base_items_small=22, base_items_large=6, max_mold_changes_small=5, max_mold_changes_large=4, excess_pct=0.15,
+    categ_id=False, final_categ_id=False,
+)
+# Campos del Tipo que lee _get_report_config (active/name deciden cual es el Tipo activo).
+REPORT_CONFIG_FIELDS = frozenset([
+    'active', 'name', 'report_sales_days',
+    'rpt_units_small_8', 'rpt_units_small_12', 'rpt_units_large_8', 'rpt_units_large_12',
+    'categ_id', 'final_categ_id',
+])
 
 
 class MrpMasterType(models.Model):
@@ -22,8 +50,8 @@ class MrpMasterType(models.Model):
     next_number = fields.Integer(
         "Siguiente número",
         default=1,
-        required=True,
-        tracking=True,
+        compute="_compute_next_numbers",
+        inverse="_inverse_next_number",
         help="Contador interno para el siguiente código Curvado/PVB.",
     )
     opt_prefix = fields.Char(
@@ -35,10 +63,24 @@ class MrpMasterType(models.Model):
     opt_next_number = fields.Integer(
         "Siguiente número OPT",
         default=1,
-        required=True,
-        tracking=True,
+        compute="_compute_next_numbers",
+        inverse="_inverse_opt_next_number",
         help="Contador interno para el siguiente código OPT.",
     )
+    code_sequence_id = fields.Many2one(
+        "ir.sequence",
+        "Secuencia Curvado/PVB",
+        readonly=True,
+        copy=False,
+        help="Secuencia atómica usada para asignar los códigos Curvado/PVB.",
+    )
+    opt_code_sequence_id = fields.Many2one(
+        "ir.sequence",
+        "Secuencia OPT",
+        readonly=True,
+        copy=False,
+        help="Secuencia atómica usada para asignar los códigos OPT.",
+    )
     location_dest_id = fields.Many2one(
         "stock.location",
         "Ubicación destino Curvado/PVB",
@@ -248,6 +290,118 @@ class MrpMasterType(models.Model):
         loc = Location.search([("complete_name", "=", "WH/PREPRODUCCION/PT-AAA")], limit=1)
         return loc.id if loc else False
 
+    @api.depends("code_sequence_id.number_next_actual", "opt_code_sequence_id.number_next_actual")
+    def _compute_next_numbers(self):
+        for rec in self:
+            for seq_field, number_field in CODE_SEQUENCE_FIELDS.values():
+                seq = rec[seq_field]
+                rec[number_field] = seq.number_next_actual if seq else rec._get_legacy_next_number(number_field)
+
+    def _inverse_next_number(self):
+        for rec in self:
+            rec._get_code_sequence('curvado_pvb').sudo().write({"number_next": rec.next_number or 1})
+
+    def _inverse_opt_next_number(self):
+        for rec in self:
+            rec._get_code_sequence('opt').sudo().write({"number_next": rec.opt_next_number or 1})
+
+    def _get_legacy_next_number(self, column):
+        """Valor del contador guardado en la columna anterior (antes de usar ir.sequence)."""
+        if not isinstance(self.id, int) or not column_exists(self.env.cr, self._table, column):
+            return 1
+        self.env.cr.execute(f"SELECT {column} FROM {self._table} WHERE id = %s", [self.id])
+        row = self.env.cr.fetchone()
+        return (row and row[0]) or 1
+
+    def _ensure_code_sequences(self):
+        """Crea las secuencias que falten (al crear el Tipo y en la migración), sembradas con el contador anterior.
+
+        Así la primera confirmación de un Tipo no escribe su fila y no serializa con otras.
+        """
+        Sequence = self.env["ir.sequence"].sudo()
+        for rec in self:
+            vals = {}
+            for seq_field, number_field in CODE_SEQUENCE_FIELDS.values():
+                if rec[seq_field]:
+                    continue
+                label = "OPT" if seq_field == 'opt_code_sequence_id' else "Curvado/PVB"
+                vals[seq_field] = Sequence.create({
+                    "name": f"Orden Maestra {rec.name} ({label})",
+                    "implementation": "standard",
+                    "number_next": rec._get_legacy_next_number(number_field),
+                    "number_increment": 1,
+                    "padding": 0,
+                    "company_id": False,
+                }).id
+            if vals:
+                rec.sudo().write(vals)
+
+    def _get_code_sequence(self, stage_type):
+        """Secuencia (ir.sequence estándar, sin bloqueos) del Tipo para la etapa."""
+        self.ensure_one()
+        seq_field = CODE_SEQUENCE_FIELDS.get(stage_type, CODE_SEQUENCE_FIELDS['curvado_pvb'])[0]
+        if not self[seq_field]:
+            # Solo para Tipos anteriores a la migración; los nuevos la reciben en create().
+            self._ensure_code_sequences()
+        return self[seq_field]
+
+    def _allocate_code_numbers(self, stage_type, count):
+        """Reserva `count` números consecutivos de la secuencia del Tipo con un solo nextval por lote.
+
+        nextval no participa del bloqueo de filas: dos confirmaciones concurrentes
+        nunca compiten por la fila de mrp.master.type.
+        """
+        self.ensure_one()
+        if count <= 0:
+            return []
+        seq = self._get_code_sequence(stage_type)
+        self.env.cr.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            ["ir_sequence_%03d" % seq.id, count],
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._ensure_code_sequences()
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Las secuencias y contadores se escriben al confirmar: no invalidar la cache por ellos.
+        if REPORT_CONFIG_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache('self.env.company.id')
+    def _get_report_config(self):
+        """Foto inmutable (ReportConfig) de los parametros de reportes del Tipo activo.
+
+        Se guarda en la cache del registro por compania y se invalida al crear o borrar
+        un Tipo, o al modificar alguno de REPORT_CONFIG_FIELDS.
+        """
+        mtype = self.sudo().search([("active", "=", True)], limit=1)
+        if not mtype:
+            return DEFAULT_REPORT_CONFIG
+        return DEFAULT_REPORT_CONFIG._replace(
+            type_id=mtype.id,
+            sales_days=int(mtype.report_sales_days or 0) or DEFAULT_REPORT_CONFIG.sales_days,
+            units_small_8=mtype.rpt_units_small_8,
+            units_small_12=mtype.rpt_units_small_12,
+            units_large_8=mtype.rpt_units_large_8,
+            units_large_12=mtype.rpt_units_large_12,
+            categ_id=mtype.categ_id.id,
+            final_categ_id=mtype.final_categ_id.id,
+        )
+
     def get_formatted_code(self, number=None):
         self.ensure_one()
         padding = int(self.env["ir.config_parameter"].sudo().get_param("mrp_master.code_padding", default="6"))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from odoo import api, models
+from odoo.tools import SQL, sql
+
+from .mrp_master_order import _log_timing
+
+_logger = logging.getLogger(__name__)
+
+
+def _ensure_trigram_index(cr, indexname, tablename, column):
+    """Crea un índice GIN gin_trgm_ops sobre la columna si pg_trgm está disponible."""
+    cr.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    if not cr.fetchone():
+        try:
+            with cr.savepoint(flush=False):
+                cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception:
+            _logger.warning("No se pudo crear la extensión pg_trgm; se omite el índice %s.", indexname)
+            return False
+    sql.create_index(cr, indexname, tablename, [f'"{column}" gin_trgm_ops'], method='gin')
+    return True
+
+
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class MrpPedidoOriginal(models.Model):
+    _inherit = "mrp.pedido.original"
+
+    def init(self):
+        super().init()
+        _ensure_trigram_index(self.env.cr, "mrp_pedido_original_name_trgm_idx", self._table, "name")
+
+    @api.model
+    def _name_search(self, name, domain=None, operator='ilike', limit=None, order=None):
+        """Búsqueda por nombre ordenada por similitud (índice trigram sobre name).
+
+        El dominio y las reglas de acceso van en la misma consulta (self._search), de modo que
+        el LIMIT se aplica sobre registros ya permitidos; ``order`` desempata tras la similitud.
+        """
+        name = (name or '').strip()
+        if not name or operator != 'ilike':
+            return super()._name_search(name, domain=domain, operator=operator, limit=limit, order=order)
+        start = time.perf_counter()
+        self.flush_model(['name'])
+        query = self._search(domain or [])
+        name_sql = SQL.identifier(query.table, 'name')
+        query.add_where(SQL("(%s ILIKE %s OR %s %% %s)", name_sql, f"%{_like_escape(name)}%", name_sql, name))
+        query.order = SQL(
+            "similarity(%s, %s) DESC, %s", name_sql, name, self._order_to_sql(order or self._order, query)
+        )
+        query.limit = limit
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute(query.select())
+                result = [row[0] for row in self.env.cr.fetchall()]
+        except Exception:
+            # Sin pg_trgm no existen similarity() ni el operador %.
+            return super()._name_search(name, domain=domain, operator=operator, limit=limit, order=order)
+        _log_timing("mrp.pedido.original._name_search", start, f"name={name} results={len(result)}")
+        return result
+
+class ProductProduct(models.Model):
+    _inherit = "product.product"
+
+    def init(self):
+        super().init()
+        _ensure_trigram_index(self.env.cr, "product_product_default_code_trgm_idx", self._table, "default_code")
+
+
+class MrpProduction(models.Model):
+    _inherit = "mrp.production"
+
+    def init(self):
+        super().init()
+        _ensure_trigram_index(self.env.cr, "mrp_production_origin_trgm_idx", self._table, "origin")
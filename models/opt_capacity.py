@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""Asignacion de capacidad del plan diario OPT.
+
+Cada item es el dict que arma mrp.report.production.daily._get_plan_items().
+Un escenario es un dict con ``capacity``, ``max_items`` (marcas a seleccionar),
+``excess_pct`` (fraccion de la capacidad para excedente) y opcionalmente
+``selection`` ('ranking' u 'optimal') y ``time_budget`` (segundos).
+_plan_capacity evalua varios escenarios en una sola llamada: con NumPy lo hace en
+forma matricial (escenarios x productos); sin NumPy recorre los escenarios con la
+version en Python.
+"""
+
+import math
+import time
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy es opcional
+    np = None
+
+# Peso por unidad cubierta segun prioridad de venta (3 = ventas mayores al stock).
+PRIORITY_WEIGHTS = {3: 1000.0, 2: 100.0, 1: 10.0, 0: 1.0}
+# Tamaño maximo del eje de capacidad de la programacion dinamica (se escala si es mayor).
+MAX_DP_CAPACITY = 2000
+DEFAULT_TIME_BUDGET = 2.0
+
+
+def _allocate_capacity(items, capacity, key):
+    remaining = capacity
+    for item in sorted(items, key=lambda i: (i.get("priority_rank", 0), i[key]), reverse=True):
+        if remaining <= 0:
+            break
+        if (item.get("required") or 0.0) <= 0.0:
+            continue
+        remaining_req = max(0.0, (item.get("required") or 0.0) - (item.get("produce") or 0.0))
+        need = min(item[key], remaining_req)
+        if need <= 0:
+            continue
+        cap_left = item["cap_left"]
+        alloc = min(need, remaining, cap_left)
+        if alloc <= 0:
+            continue
+        item["produce"] += alloc
+        item["cap_left"] -= alloc
+        remaining -= alloc
+    return remaining
+
+
+def _select_top_items(items, max_items):
+    if max_items <= 0:
+        return []
+    ordered = sorted(
+        items,
+        key=lambda i: (i.get("priority_rank", 0), i.get("required", 0.0), i.get("sales", 0.0)),
+        reverse=True,
+    )
+    selected = []
+    for item in ordered:
+        if (item.get("required") or 0.0) <= 0.0:
+            continue
+        selected.append(item)
+        if len(selected) >= max_items:
+            break
+    return selected
+
+
+def _fill_capacity(items, capacity):
+    remaining = capacity
+    remaining = _allocate_capacity(items, remaining, "prio_sales")
+    remaining = _allocate_capacity(items, remaining, "sales")
+    need_min_items = []
+    for item in items:
+        if item["min"] <= 0 and item["max"] <= 0:
+            continue
+        need_min = max(0.0, item["min"] - (item["stock"] + item["in_process"] - item["sales"]))
+        item["need_min"] = need_min
+        need_min_items.append(item)
+    remaining = _allocate_capacity(need_min_items, remaining, "need_min")
+    need_max_items = []
+    for item in items:
+        if item["max"] <= 0:
+            continue
+        need_max = max(0.0, item["max"] + item["sales"] - item["stock"] - item["in_process"])
+        item["need_max"] = need_max
+        need_max_items.append(item)
+    remaining = _allocate_capacity(need_max_items, remaining, "need_max")
+    return remaining
+
+
+def _allocate_excess(items, extra_cap):
+    """Reparte el excedente (hasta el maximo) entre los items con mayor necesidad; {indice: cantidad}."""
+    remaining = extra_cap
+    candidates = []
+    for idx, item in enumerate(items):
+        if item["max"] <= 0:
+            continue
+        need = max(0.0, item["max"] + item["sales"] - item["stock"] - item["produce"])
+        if need <= 0:
+            continue
+        candidates.append((idx, need, item["cap_left"]))
+    extra = {}
+    for idx, need, cap_left in sorted(candidates, key=lambda c: c[1], reverse=True):
+        if remaining <= 0:
+            break
+        alloc = min(need, remaining, cap_left)
+        if alloc <= 0:
+            continue
+        extra[idx] = alloc
+        remaining -= alloc
+    return extra
+
+
+def _ranking_order(items):
+    """Indices en el orden de _select_top_items (prioridad, requerido, ventas; estable)."""
+    return sorted(
+        range(len(items)),
+        key=lambda i: (items[i].get("priority_rank", 0), items[i].get("required", 0.0), items[i].get("sales", 0.0)),
+        reverse=True,
+    )
+
+
+def _item_weight(item):
+    return PRIORITY_WEIGHTS.get(int(item.get("priority_rank") or 0), 1.0)
+
+
+def _selection_value(items, indices, capacity):
+    """Demanda cubierta ponderada de un conjunto: se llena por peso hasta agotar la capacidad."""
+    remaining = capacity
+    value = 0.0
+    for idx in sorted(indices, key=lambda i: _item_weight(items[i]), reverse=True):
+        if remaining <= 0:
+            break
+        qty = min(max(0.0, min(items[idx]["required"], items[idx]["cap_left"])), remaining)
+        value += qty * _item_weight(items[idx])
+        remaining -= qty
+    return value
+
+
+def _select_optimal_items(items, capacity, max_items, time_budget=DEFAULT_TIME_BUDGET):
+    """Elige hasta max_items marcas maximizando la demanda cubierta ponderada por prioridad.
+
+    Mochila con limite de cardinalidad resuelta por programacion dinamica sobre
+    (marcas elegidas, capacidad usada). Los items se recorren por peso decreciente, de
+    modo que solo el ultimo elegido puede quedar parcial: tomar min(v, capacidad libre)
+    en cada paso es exacto. Por cada peso se conservan las max_items marcas de mayor
+    cobertura (las demas estan dominadas). Devuelve (indices en orden de ranking,
+    es_optimo); si se agota time_budget devuelve la seleccion por ranking.
+    """
+    ranking = _ranking_order(items)
+    fallback = [i for i in ranking if (items[i].get("required") or 0.0) > 0.0][:max(0, max_items)]
+    if max_items <= 0 or capacity <= 0:
+        return fallback, True
+    deadline = time.perf_counter() + (time_budget or DEFAULT_TIME_BUDGET)
+    unit = max(1, math.ceil(capacity / MAX_DP_CAPACITY))
+    cap_units = int(capacity // unit)
+    by_weight = {}
+    for idx in ranking:
+        item = items[idx]
+        cover = int(min(item["required"] or 0.0, item["cap_left"]) // unit)
+        if cover > 0:
+            by_weight.setdefault(_item_weight(item), []).append((cover, idx))
+    candidates = []
+    for weight in sorted(by_weight, reverse=True):
+        best = sorted(by_weight[weight], key=lambda c: c[0], reverse=True)[:max_items]
+        candidates.extend((weight, cover, idx) for cover, idx in best)
+
+    neg = float("-inf")
+    dp = [[neg] * (cap_units + 1) for _k in range(max_items + 1)]
+    dp[0][0] = 0.0
+    takes = []
+    for weight, cover, _idx in candidates:
+        if time.perf_counter() > deadline:
+            return fallback, False
+        take = {}
+        for k in range(min(max_items - 1, len(takes)), -1, -1):
+            row = dp[k]
+            nxt = dp[k + 1]
+            for c in range(cap_units + 1):
+                base = row[c]
+                if base == neg:
+                    continue
+                c2 = min(cap_units, c + cover)
+                val = base + weight * (c2 - c)
+                if val > nxt[c2]:
+                    nxt[c2] = val
+                    take[(k + 1, c2)] = c
+        takes.append(take)
+
+    best_k, best_c, best_val = 0, 0, 0.0
+    for k in range(max_items + 1):
+        for c in range(cap_units + 1):
+            if dp[k][c] > best_val:
+                best_k, best_c, best_val = k, c, dp[k][c]
+    chosen = set()
+    k, c = best_k, best_c
+    for pos in range(len(candidates) - 1, -1, -1):
+        if k == 0:
+            break
+        prev_c = takes[pos].get((k, c))
+        if prev_c is None:
+            continue
+        chosen.add(candidates[pos][2])
+        k, c = k - 1, prev_c
+    return [i for i in ranking if i in chosen], True
+
+
+def _resolve_selections(items, scenarios, suggested):
+    """Precalcula la seleccion optima de los escenarios que la piden (clave ``selected_idx``)."""
+    resolved = []
+    for scenario in scenarios:
+        scenario = dict(scenario)
+        if suggested and scenario.get("selection") == "optimal":
+            scenario["selected_idx"], scenario["optimal"] = _select_optimal_items(
+                items, scenario["capacity"], int(scenario["max_items"]), scenario.get("time_budget"),
+            )
+        resolved.append(scenario)
+    return resolved
+
+
+def _plan_capacity_python(items, scenario, suggested):
+    work = [dict(item, produce=0.0) for item in items]
+    index_of = {id(item): idx for idx, item in enumerate(work)}
+    if not suggested:
+        selected = list(work)
+    elif scenario.get("selected_idx") is not None:
+        selected = [work[idx] for idx in scenario["selected_idx"]]
+    else:
+        selected = _select_top_items(work, scenario["max_items"])
+    _fill_capacity(selected, scenario["capacity"])
+    extra = {}
+    if suggested:
+        excess = _allocate_excess(selected, scenario["capacity"] * scenario["excess_pct"])
+        extra = {index_of[id(selected[pos])]: qty for pos, qty in excess.items()}
+    return {
+        "selected": [index_of[id(item)] for item in selected],
+        "produce": [item["produce"] for item in work],
+        "cap_left": [item["cap_left"] for item in work],
+        "extra": [extra.get(idx, 0.0) for idx in range(len(work))],
+    }
+
+
+def _allocate_matrix(key, prio, rank_pos, required, produce, cap_left, remaining, mask):
+    """Version matricial de _allocate_capacity para todos los escenarios a la vez.
+
+    El orden (prioridad, clave; empates por posicion en el ranking) es comun a los
+    escenarios; lo asignado a cada item es min(demanda, capacidad restante tras los
+    anteriores), es decir clip(capacidad - suma acumulada previa, 0, demanda).
+    """
+    order = np.lexsort((rank_pos, -key, -prio))
+    need = np.minimum(key, np.maximum(0.0, required - produce))
+    demand = np.where(mask & (required > 0), np.maximum(0.0, np.minimum(need, cap_left)), 0.0)
+    demand_sorted = demand[:, order]
+    before = np.cumsum(demand_sorted, axis=1) - demand_sorted
+    alloc_sorted = np.clip(remaining[:, None] - before, 0.0, demand_sorted)
+    alloc = np.empty_like(alloc_sorted)
+    alloc[:, order] = alloc_sorted
+    return alloc
+
+
+def _plan_capacity_numpy(items, scenarios, suggested):
+    def column(name):
+        return np.array([float(item.get(name) or 0.0) for item in items])
+
+    n_items = len(items)
+    n_scen = len(scenarios)
+    prio = column("priority_rank")
+    required = column("required")
+    sales = column("sales")
+    prio_sales = column("prio_sales")
+    stock = column("stock")
+    in_process = column("in_process")
+    min_qty = column("min")
+    max_qty = column("max")
+    capacity = np.array([float(sc["capacity"]) for sc in scenarios])
+
+    idx = np.arange(n_items)
+    if suggested:
+        order = np.lexsort((idx, -sales, -required, -prio))
+        eligible = required[order] > 0
+        rank = np.cumsum(eligible) - 1
+        max_items = np.array([int(sc["max_items"]) for sc in scenarios])[:, None]
+        selected_sorted = eligible[None, :] & (rank[None, :] < max_items)
+        selected = np.zeros((n_scen, n_items), dtype=bool)
+        selected[:, order] = selected_sorted
+        for row, scenario in enumerate(scenarios):
+            if scenario.get("selected_idx") is not None:
+                selected[row] = False
+                selected[row, scenario["selected_idx"]] = True
+    else:
+        order = idx
+        selected = np.ones((n_scen, n_items), dtype=bool)
+    rank_pos = np.empty(n_items, dtype=int)
+    rank_pos[order] = idx
+
+    produce = np.zeros((n_scen, n_items))
+    cap_left = np.tile(column("cap_left"), (n_scen, 1))
+    remaining = capacity.copy()
+    need_min = np.maximum(0.0, min_qty - (stock + in_process - sales))
+    need_max = np.maximum(0.0, max_qty + sales - stock - in_process)
+    passes = (
+        (prio_sales, selected),
+        (sales, selected),
+        (need_min, selected & ((min_qty > 0) | (max_qty > 0))),
+        (need_max, selected & (max_qty > 0)),
+    )
+    for key, mask in passes:
+        alloc = _allocate_matrix(key, prio, rank_pos, required, produce, cap_left, remaining, mask)
+        produce += alloc
+        cap_left -= alloc
+        remaining -= alloc.sum(axis=1)
+
+    extra = np.zeros((n_scen, n_items))
+    if suggested:
+        extra_cap = capacity * np.array([float(sc["excess_pct"]) for sc in scenarios])
+        need_ex = np.where(selected & (max_qty > 0), np.maximum(0.0, max_qty + sales - stock - produce), 0.0)
+        ex_order = np.lexsort((np.broadcast_to(rank_pos, need_ex.shape), -need_ex), axis=-1)
+        demand = np.maximum(0.0, np.minimum(need_ex, cap_left))
+        demand_sorted = np.take_along_axis(demand, ex_order, axis=1)
+        before = np.cumsum(demand_sorted, axis=1) - demand_sorted
+        alloc_sorted = np.clip(extra_cap[:, None] - before, 0.0, demand_sorted)
+        np.put_along_axis(extra, ex_order, alloc_sorted, axis=1)
+
+    plans = []
+    for row in range(n_scen):
+        plans.append({
+            "selected": [int(i) for i in order if selected[row, i]],
+            "produce": produce[row].tolist(),
+            "cap_left": cap_left[row].tolist(),
+            "extra": extra[row].tolist(),
+        })
+    return plans
+
+
+def _plan_capacity(items, scenarios, suggested=True):
+    """Plan por escenario: indices seleccionados (en orden de ranking), produccion, capacidad de molde restante y excedente."""
+    if not scenarios:
+        return []
+    scenarios = _resolve_selections(items, scenarios, suggested)
+    if np is None or not items:
+        plans = [_plan_capacity_python(items, scenario, suggested) for scenario in scenarios]
+    else:
+        plans = _plan_capacity_numpy(items, scenarios, suggested)
+    for plan, scenario in zip(plans, scenarios):
+        plan["optimal"] = scenario.get("optimal", False)
+    return plans
+
+
+def _apply_plan(items, plan):
+    """Vuelca un plan en los items (produce, cap_left, extra) y devuelve los seleccionados."""
+    for idx, item in enumerate(items):
+        item["produce"] = plan["produce"][idx]
+        item["cap_left"] = plan["cap_left"][idx]
+        item["extra"] = plan["extra"][idx]
+    return [items[idx] for idx in plan["selected"]]
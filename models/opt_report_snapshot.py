@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from datetime import timedelta
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+from .mrp_master_order import _log_timing
+from .opt_reports import _count_input_changes_since, _get_inputs_fingerprint
+
+_logger = logging.getLogger(__name__)
+
+SNAPSHOT_RETENTION_PARAM = "mrp_master.opt_snapshot_retention_days"
+DEFAULT_SNAPSHOT_RETENTION_DAYS = 90
+PREGENERATED_MAX_AGE_PARAM = "mrp_master.opt_pregenerated_max_age_hours"
+DEFAULT_PREGENERATED_MAX_AGE_HOURS = 24
+# Reportes que el cron nocturno deja listos (el orden importa: materias primas reutiliza
+# la foto de entradas que dejó el diario).
+PREGENERATED_REPORTS = (
+    "mrp.report.production.daily",
+    "mrp.report.in_process",
+    "mrp.report.raw_materials",
+)
+
+# Qué se guarda de cada reporte: parámetros del encabezado, columnas numéricas de las
+# líneas, la marca que separa dos filas del mismo producto, la columna del total y los
+# campos calculados no almacenados que se congelan con la foto ("frozen").
+SNAPSHOT_SPECS = {
+    "mrp.report.production.daily": {
+        "line_model": "mrp.report.production.daily.line",
+        "params": [
+            "report_type", "size_filter", "turns_small", "hours_per_turn_small", "turns_large",
+            "hours_per_turn_large", "max_mold_changes_small", "max_mold_changes_large", "excess_pct",
+            "selection_method",
+        ],
+        "columns": [
+            "max_qty", "min_qty", "stock_qty", "sales_qty", "priority_sales_qty", "in_process_qty",
+            "molds_qty", "required_qty", "produce_qty",
+        ],
+        "flag": "is_excess",
+        "total": "produce_qty",
+        "frozen": ["size_category"],
+    },
+    "mrp.report.in_process": {
+        "line_model": "mrp.report.in_process.line",
+        "params": ["size_filter", "show_valued"],
+        "columns": ["stock_qty", "qty_pt", "qty_s1", "qty_s2", "qty_s3", "qty_total"],
+        "flag": False,
+        "total": "qty_total",
+        "frozen": [
+            "size_category", "cost_unit", "cost_s1_total", "cost_s2_total", "cost_s3_total",
+            "cost_pt_total", "cost_total",
+        ],
+    },
+    "mrp.report.raw_materials": {
+        "line_model": "mrp.report.raw_materials.line",
+        "params": ["size_filter", "turns_small", "hours_per_turn_small", "turns_large", "hours_per_turn_large"],
+        "columns": ["min_qty", "max_qty", "required_qty", "stock_mp_qty", "stock_pre_qty", "in_process_qty"],
+        "flag": "is_extra",
+        "total": "required_qty",
+        "frozen": ["size_category"],
+    },
+    "mrp.report.sales_no_stock": {
+        "line_model": "mrp.report.sales_no_stock.line",
+        "params": ["size_filter", "categ_id"],
+        "columns": ["stock_qty", "sales_qty", "priority_sales_qty", "shortfall_qty", "in_process_qty"],
+        "flag": False,
+        "total": "shortfall_qty",
+        "frozen": ["size_category"],
+    },
+}
+
+REPORT_SELECTION = [
+    ("mrp.report.production.daily", "Produccion diaria"),
+    ("mrp.report.in_process", "Productos en proceso"),
+    ("mrp.report.raw_materials", "Materias primas"),
+    ("mrp.report.sales_no_stock", "Ventas sin stock"),
+]
+
+
+def _snapshot_row_map(snapshot):
+    """{(product_id, marca): {columna: cantidad}} a partir del JSON de la foto."""
+    data = snapshot.data or {}
+    columns = data.get("columns") or []
+    result = {}
+    for row in data.get("rows") or []:
+        product_id, _code, _name, flag = row[:4]
+        result[(product_id, bool(flag))] = dict(zip(columns, row[4:]))
+    return result
+
+
+class MrpReportSnapshot(models.Model):
+    _name = "mrp.report.snapshot"
+    _description = "Foto de reporte OPT"
+    _order = "create_date desc, id desc"
+
+    name = fields.Char("Nombre", required=True)
+    report_model = fields.Selection(REPORT_SELECTION, string="Reporte", required=True, index=True)
+    company_id = fields.Many2one("res.company", "Compañía", required=True, index=True, default=lambda self: self.env.company)
+    report_date = fields.Date("Fecha del reporte")
+    params = fields.Json("Parámetros")
+    data = fields.Json("Datos", prefetch=False)
+    line_count = fields.Integer("# Líneas")
+    total_qty = fields.Float("Total", digits=(16, 0))
+    total_label = fields.Char("Total de")
+    is_pregenerated = fields.Boolean("Pregenerado", readonly=True, help="Generado por el cron nocturno.")
+    inputs_built_at = fields.Datetime(
+        "Datos de entrada del", readonly=True,
+        help="Momento en que se leyeron los datos de entrada (puede ser anterior a la foto por la cache).",
+    )
+    inputs_fingerprint = fields.Char("Huella de entradas", readonly=True)
+
+    @api.model
+    def _create_from_report(self, report):
+        """Guarda el resultado ya generado del reporte: encabezado, filas compactas y totales."""
+        spec = SNAPSHOT_SPECS[report._name]
+        Line = self.env[spec["line_model"]]
+        flag = spec["flag"]
+        columns = spec["columns"]
+        frozen = spec["frozen"]
+        read_fields = ["product_id", "product_code", "product_name"] + ([flag] if flag else []) + columns + frozen
+        rows = [
+            [
+                line["product_id"][0] if line["product_id"] else False,
+                line["product_code"] or "",
+                line["product_name"] or "",
+                bool(line[flag]) if flag else False,
+            ] + [line[col] or 0.0 for col in columns] + [line[fname] for fname in frozen]
+            for line in Line.search_read([("wizard_id", "=", report.id)], read_fields, order="id")
+        ]
+        params = {}
+        for fname in spec["params"]:
+            value = report[fname]
+            params[fname] = value.id if isinstance(value, models.BaseModel) else value
+        total_idx = 4 + columns.index(spec["total"])
+        # "Regenerar ahora" sobre la foto del cron con los mismos parámetros reemplaza la foto del menú.
+        source = report.snapshot_id
+        is_pregenerated = bool(self.env.context.get("opt_pregenerated")) or bool(
+            source.is_pregenerated and source.params == params and source.report_date == report.report_date
+        )
+        return self.create({
+            "name": "%s %s" % (dict(REPORT_SELECTION)[report._name], fields.Date.to_string(report.report_date) or ""),
+            "report_model": report._name,
+            "company_id": self.env.company.id,
+            "report_date": report.report_date,
+            "params": params,
+            "data": {"columns": columns, "frozen": frozen, "rows": rows},
+            "line_count": len(rows),
+            "total_qty": sum(row[total_idx] for row in rows),
+            "total_label": Line._fields[spec["total"]].string,
+            "is_pregenerated": is_pregenerated,
+            "inputs_built_at": report.inputs_built_at or fields.Datetime.now(),
+            "inputs_fingerprint": report.inputs_fingerprint,
+        })
+
+    def _get_previous(self):
+        self.ensure_one()
+        return self.search([
+            ("report_model", "=", self.report_model),
+            ("company_id", "=", self.company_id.id),
+            ("create_date", "<", self.create_date),
+        ], order="create_date desc, id desc", limit=1)
+
+    def action_open_report(self):
+        """Reconstruye el reporte desde la foto (sin recalcular nada).
+
+        Los campos calculados de las líneas (tamaño, costos, referencia) se muestran con el
+        valor guardado en la foto, no con el de hoy.
+        """
+        self.ensure_one()
+        spec = SNAPSHOT_SPECS[self.report_model]
+        flag = spec["flag"]
+        data = self.data or {}
+        columns = data.get("columns") or []
+        frozen = data.get("frozen") or []
+        report = self.env[self.report_model].create(
+            dict(self.params or {}, report_date=self.report_date, snapshot_id=self.id)
+        )
+        vals_list = []
+        for row in data.get("rows") or []:
+            vals = dict(zip(columns, row[4:]))
+            vals.update({
+                "wizard_id": report.id,
+                "product_id": row[0],
+                "product_code": row[1],
+                "product_name": row[2],
+            })
+            if "frozen" in data:
+                vals["frozen_values"] = dict(
+                    zip(frozen, row[4 + len(columns):]), product_code=row[1], product_name=row[2]
+                )
+            if flag:
+                vals[flag] = row[3]
+            vals_list.append(vals)
+        self.env[spec["line_model"]].create(vals_list)
+        return {
+            "type": "ir.actions.act_window",
+            "name": self.name,
+            "res_model": self.report_model,
+            "res_id": report.id,
+            "view_mode": "form",
+            "target": "current",
+        }
+
+    def action_compare_previous(self):
+        self.ensure_one()
+        previous = self._get_previous()
+        if not previous:
+            raise UserError(_("No hay una foto anterior de este reporte para comparar."))
+        diff = self.env["mrp.report.snapshot.diff"].create({
+            "snapshot_from_id": previous.id,
+            "snapshot_to_id": self.id,
+        })
+        return diff.action_compute()
+
+    @api.model
+    def _action_open_latest(self, report_model):
+        """Abre la última foto pregenerada vigente del reporte; si no hay, un reporte nuevo."""
+        try:
+            hours = int(self.env["ir.config_parameter"].sudo().get_param(
+                PREGENERATED_MAX_AGE_PARAM, default=DEFAULT_PREGENERATED_MAX_AGE_HOURS
+            ))
+        except (TypeError, ValueError):
+            hours = DEFAULT_PREGENERATED_MAX_AGE_HOURS
+        snapshot = self.search([
+            ("report_model", "=", report_model),
+            ("company_id", "=", self.env.company.id),
+            ("is_pregenerated", "=", True),
+            ("create_date", ">=", fields.Datetime.now() - timedelta(hours=hours)),
+        ], limit=1)
+        if snapshot:
+            return snapshot.action_open_report()
+        return {
+            "type": "ir.actions.act_window",
+            "name": dict(REPORT_SELECTION)[report_model],
+            "res_model": report_model,
+            "view_mode": "form",
+            "target": "current",
+        }
+
+    @api.model
+    def cron_pregenerate_reports(self):
+        """Generar de madrugada los reportes de PREGENERATED_REPORTS para cada compañía."""
+        commit = not self.env.registry.in_test_mode()
+        for company in self.env["res.company"].search([]):
+            for report_model in PREGENERATED_REPORTS:
+                start = time.perf_counter()
+                env = self.with_company(company).with_context(opt_pregenerated=True).env
+                try:
+                    with self.env.cr.savepoint():
+                        env[report_model].create({}).action_generate()
+                except UserError as err:
+                    # Sin datos para el reporte: no es un error del cron.
+                    _logger.info("Reporte %s sin pregenerar para %s: %s", report_model, company.name, err)
+                    continue
+                except Exception:
+                    _logger.exception("Error al pregenerar %s para %s", report_model, company.name)
+                    continue
+                _log_timing("mrp.report.snapshot.cron_pregenerate_reports", start, f"{report_model} company={company.id}")
+                if commit:
+                    self.env.cr.commit()
+        return True
+
+    @api.model
+    def cron_purge_snapshots(self):
+        """Eliminar fotos más antiguas que mrp_master.opt_snapshot_retention_days (0 = conservar todo)."""
+        try:
+            days = int(self.env["ir.config_parameter"].sudo().get_param(
+                SNAPSHOT_RETENTION_PARAM, default=DEFAULT_SNAPSHOT_RETENTION_DAYS
+            ))
+        except (TypeError, ValueError):
+            days = DEFAULT_SNAPSHOT_RETENTION_DAYS
+        if days <= 0:
+            return True
+        self.sudo().search([("create_date", "<", fields.Datetime.now() - timedelta(days=days))]).unlink()
+        return True
+
+
+class MrpReportSnapshotDiff(models.TransientModel):
+    _name = "mrp.report.snapshot.diff"
+    _description = "Comparar fotos de reporte OPT"
+
+    snapshot_from_id = fields.Many2one("mrp.report.snapshot", "Desde", required=True, ondelete="cascade")
+    snapshot_to_id = fields.Many2one("mrp.report.snapshot", "Hasta", required=True, ondelete="cascade")
+    report_model = fields.Selection(
+        REPORT_SELECTION, string="Reporte", compute="_compute_report_model", store=True, readonly=False,
+    )
+    only_changes = fields.Boolean("Solo cambios", default=True)
+    line_ids = fields.One2many("mrp.report.snapshot.diff.line", "diff_id", string="Diferencias")
+
+    @api.depends("snapshot_to_id")
+    def _compute_report_model(self):
+        for rec in self:
+            rec.report_model = rec.snapshot_to_id.report_model or rec.report_model
+
+    def action_compute(self):
+        """Diferencias por producto y columna entre dos fotos, leyendo solo el JSON guardado."""
+        self.ensure_one()
+        if self.snapshot_from_id.report_model != self.snapshot_to_id.report_model:
+            raise UserError(_("Solo se pueden comparar fotos del mismo reporte."))
+        start = time.perf_counter()
+        spec = SNAPSHOT_SPECS[self.report_model]
+        Line = self.env[spec["line_model"]]
+        flag_label = Line._fields[spec["flag"]].string if spec["flag"] else ""
+        old = _snapshot_row_map(self.snapshot_from_id)
+        new = _snapshot_row_map(self.snapshot_to_id)
+        self.line_ids.unlink()
+        vals_list = []
+        for key in sorted(set(old) | set(new)):
+            product_id, flag = key
+            old_vals = old.get(key, {})
+            new_vals = new.get(key, {})
+            for col in spec["columns"]:
+                qty_from = old_vals.get(col, 0.0) or 0.0
+                qty_to = new_vals.get(col, 0.0) or 0.0
+                if self.only_changes and qty_from == qty_to:
+                    continue
+                bucket = Line._fields[col].string
+                vals_list.append({
+                    "diff_id": self.id,
+                    "product_id": product_id,
+                    "bucket": f"{bucket} ({flag_label})" if flag else bucket,
+                    "qty_from": qty_from,
+                    "qty_to": qty_to,
+                    "delta": qty_to - qty_from,
+                })
+        self.env["mrp.report.snapshot.diff.line"].create(vals_list)
+        _log_timing("mrp.report.snapshot.diff.action_compute", start, f"lines={len(vals_list)}")
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Comparar fotos"),
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "current",
+        }
+
+
+class MrpReportSnapshotDiffLine(models.TransientModel):
+    _name = "mrp.report.snapshot.diff.line"
+    _description = "Diferencia entre fotos de reporte OPT"
+    _order = "product_id, bucket"
+
+    diff_id = fields.Many2one("mrp.report.snapshot.diff", required=True, ondelete="cascade")
+    product_id = fields.Many2one("product.product", string="Producto")
+    bucket = fields.Char("Columna")
+    qty_from = fields.Float("Antes", digits=(16, 0))
+    qty_to = fields.Float("Después", digits=(16, 0))
+    delta = fields.Float("Diferencia", digits=(16, 0))
+
+
+class MrpReportSnapshotMixin(models.AbstractModel):
+    _name = "mrp.report.snapshot.mixin"
+    _description = "Foto y vigencia de reporte OPT"
+
+    snapshot_id = fields.Many2one("mrp.report.snapshot", string="Foto", readonly=True, ondelete="set null")
+    snapshot_date = fields.Datetime(related="snapshot_id.inputs_built_at", string="Generado")
+    is_stale = fields.Boolean("Desactualizado", compute="_compute_is_stale")
+
+    @api.depends("snapshot_id")
+    def _compute_is_stale(self):
+        """Comparar la huella guardada con la actual: una consulta al catálogo, sin recorrer tablas."""
+        fingerprints = set(self.snapshot_id.mapped("inputs_fingerprint")) - {False}
+        current = _get_inputs_fingerprint(self.env) if fingerprints else False
+        for rec in self:
+            saved = rec.snapshot_id.inputs_fingerprint
+            rec.is_stale = bool(saved) and saved != current
+
+    def action_show_input_changes(self):
+        """Contar a pedido los registros modificados desde que se leyeron los datos de entrada."""
+        self.ensure_one()
+        changes = _count_input_changes_since(self.env, self.snapshot_date) if self.snapshot_date else {}
+        if changes:
+            message = ", ".join(f"{label}: {count}" for label, count in sorted(changes.items()))
+        else:
+            message = _("Sin registros modificados; los cambios pueden ser bajas de registros.")
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": _("Cambios desde la generación"),
+                "message": message,
+                "type": "warning",
+                "sticky": False,
+            },
+        }
+
+    def _store_snapshot(self):
+        if not self.env.context.get("opt_skip_snapshot"):
+            self.snapshot_id = self.env["mrp.report.snapshot"]._create_from_report(self)
+
+    @api.model
+    def action_open_latest_report(self):
+        return self.env["mrp.report.snapshot"]._action_open_latest(self._name)
+
+
+class MrpReportSnapshotLineMixin(models.AbstractModel):
+    _name = "mrp.report.snapshot.line.mixin"
+    _description = "Línea de reporte OPT reconstruida desde una foto"
+
+    frozen_values = fields.Json("Valores de la foto", readonly=True)
+
+    def _split_frozen(self):
+        """(líneas que se calculan en vivo, líneas reconstruidas con valores de la foto)."""
+        frozen = self.filtered("frozen_values")
+        return self - frozen, frozen
+
+    def _set_frozen_values(self, fnames):
+        for line in self:
+            for fname in fnames:
+                line[fname] = line.frozen_values.get(fname) or False
+
+
+class MRPReportProductionDaily(models.TransientModel):
+    _name = "mrp.report.production.daily"
+    _inherit = ["mrp.report.production.daily", "mrp.report.snapshot.mixin"]
+
+    def action_generate(self):
+        res = super().action_generate()
+        self._store_snapshot()
+        return res
+
+
+class MRPReportProductionDailyLine(models.TransientModel):
+    _name = "mrp.report.production.daily.line"
+    _inherit = ["mrp.report.production.daily.line", "mrp.report.snapshot.line.mixin"]
+
+    @api.depends("product_id")
+    def _compute_product_info(self):
+        live, frozen = self._split_frozen()
+        super(MRPReportProductionDailyLine, live)._compute_product_info()
+        frozen._set_frozen_values(["product_code", "product_name", "size_category"])
+
+
+class MRPReportInProcess(models.TransientModel):
+    _name = "mrp.report.in_process"
+    _inherit = ["mrp.report.in_process", "mrp.report.snapshot.mixin"]
+
+    def action_generate(self):
+        res = super().action_generate()
+        self._store_snapshot()
+        return res
+
+
+class MRPReportInProcessLine(models.TransientModel):
+    _name = "mrp.report.in_process.line"
+    _inherit = ["mrp.report.in_process.line", "mrp.report.snapshot.line.mixin"]
+
+    @api.depends("product_id")
+    def _compute_size_category(self):
+        live, frozen = self._split_frozen()
+        super(MRPReportInProcessLine, live)._compute_size_category()
+        frozen._set_frozen_values(["size_category"])
+
+    @api.depends("product_id", "qty_s1", "qty_s2", "qty_s3", "qty_pt", "qty_total")
+    def _compute_costs(self):
+        live, frozen = self._split_frozen()
+        super(MRPReportInProcessLine, live)._compute_costs()
+        frozen._set_frozen_values([
+            "cost_unit", "cost_s1_total", "cost_s2_total", "cost_s3_total", "cost_pt_total", "cost_total",
+        ])
+
+
+class MRPReportRawMaterials(models.TransientModel):
+    _name = "mrp.report.raw_materials"
+    _inherit = ["mrp.report.raw_materials", "mrp.report.snapshot.mixin"]
+
+    def action_generate(self):
+        res = super().action_generate()
+        self._store_snapshot()
+        return res
+
+
+class MRPReportRawMaterialsLine(models.TransientModel):
+    _name = "mrp.report.raw_materials.line"
+    _inherit = ["mrp.report.raw_materials.line", "mrp.report.snapshot.line.mixin"]
+
+    @api.depends("product_id")
+    def _compute_size_category(self):
+        live, frozen = self._split_frozen()
+        super(MRPReportRawMaterialsLine, live)._compute_size_category()
+        frozen._set_frozen_values(["size_category"])
+
+
+class MRPReportSalesNoStock(models.TransientModel):
+    _name = "mrp.report.sales_no_stock"
+    _inherit = ["mrp.report.sales_no_stock", "mrp.report.snapshot.mixin"]
+
+    def action_generate(self):
+        res = super().action_generate()
+        self._store_snapshot()
+        return res
+
+
+class MRPReportSalesNoStockLine(models.TransientModel):
+    _name = "mrp.report.sales_no_stock.line"
+    _inherit = ["mrp.report.sales_no_stock.line", "mrp.report.snapshot.line.mixin"]
+
+    @api.depends("product_id")
+    def _compute_size_category(self):
+        live, frozen = self._split_frozen()
+        super(MRPReportSalesNoStockLine, live)._compute_size_category()
+        frozen._set_frozen_values(["size_category"])
@@ -1,9 +1,40 @@
 ﻿# -*- coding: utf-8 -*-
+from collections import OrderedDict, namedtuple
 from datetime import datetime, time, timedelta
+import hashlib
+import logging
+import threading
+from time import monotonic
 import unicodedata
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
 
+from .mrp_master_type import DEFAULT_REPORT_CONFIG
+from .opt_capacity import DEFAULT_TIME_BUDGET, _apply_plan, _plan_capacity
+
+_logger = logging.getLogger(__name__)
+
+PLAN_TIME_BUDGET_PARAM = "mrp_master.opt_plan_time_budget"
+INPUTS_TTL_PARAM = "mrp_master.opt_inputs_ttl"
+DEFAULT_INPUTS_TTL = 300
+# Fotos de entradas que guarda cada proceso (una por usuario/compañías); se descarta la menos usada.
+INPUTS_CACHE_MAX_ENTRIES = 32
+# Modelos cuyas altas, cambios y bajas invalidan la foto de entradas de los reportes.
+INPUTS_FINGERPRINT_MODELS = (
+    "product.product",
+    "product.category",
+    "sale.order",
+    "sale.order.line",
+    "stock.quant",
+    "stock.warehouse.orderpoint",
+    "mrp.production",
+    "receta.pvb",
+)
+SELECTION_METHODS = [
+    ("ranking", "Ranking (rápido)"),
+    ("optimal", "Óptimo (knapsack)"),
+]
+
 
 def _end_of_day(date_value):
     if not date_value:
@@ -11,13 +42,14 @@ def _end_of_day(date_value):
     return datetime.combine(date_value, time.max)
 
 
+def _get_report_config(env):
+    """Parametros de reportes del Tipo activo (foto cacheada, ver mrp.master.type)."""
+    return env["mrp.master.type"]._get_report_config()
+
+
 def _get_report_sales_days(env):
     """Dias para ventas sin despacho (desde hoy hacia atras)."""
-    Type = env["mrp.master.type"].sudo()
-    mtype = Type.search([("active", "=", True)], limit=1)
-    if mtype and getattr(mtype, "report_sales_days", False):
-        return int(mtype.report_sales_days or 0)
-    return 30
+    return _get_report_config(env).sales_days
 
 
 def _extract_suffix(code):
@@ -32,6 +64,7 @@ def _extract_suffix(code):
 
 
 def _classify_code(code):
+    """Clasificación por prefijo de referencia; el CASE de _get_in_process_maps la replica en SQL."""
     if not code:
         return "pt", ""
     if code.startswith("VE-"):
@@ -48,19 +81,11 @@ def _classify_code(code):
 def _get_turn_capacity(turns, hours, size, env=None):
     turns = int(turns or 0)
     hours = int(hours or 0)
-    per_turn = None
-    if env is not None:
-        mtype = env["mrp.master.type"].sudo().search([("active", "=", True)], limit=1)
-        if mtype:
-            if size == "small":
-                per_turn = mtype.rpt_units_small_8 if hours == 8 else mtype.rpt_units_small_12
-            else:
-                per_turn = mtype.rpt_units_large_8 if hours == 8 else mtype.rpt_units_large_12
-    if per_turn is None:
-        if size == "small":
-            per_turn = 88 if hours == 8 else 132
-        else:
-            per_turn = 24 if hours == 8 else 36
+    config = _get_report_config(env) if env is not None else DEFAULT_REPORT_CONFIG
+    if size == "small":
+        per_turn = config.units_small_8 if hours == 8 else config.units_small_12
+    else:
+        per_turn = config.units_large_8 if hours == 8 else config.units_large_12
     return turns * per_turn
 
 
@@ -69,8 +94,8 @@ def _validate_turns(turns, hours):
         raise UserError(_("No se permiten 3 turnos de 12 horas."))
 
 
-def _get_category_size(product):
-    complete = (product.categ_id.complete_name or "").upper()
+def _category_size_from_name(complete_name):
+    complete = (complete_name or "").upper()
     norm = unicodedata.normalize('NFKD', complete).encode('ascii', 'ignore').decode('ascii')
     norm = norm.replace(" ", "")
     if "AUTOMOTRIZ/MGRANDES" in norm:
@@ -80,6 +105,63 @@ def _get_category_size(product):
     return "other"
 
 
+def _get_category_size_map(categories):
+    """{categ_id: tamaño} normalizando el nombre una vez por categoría (no por producto)."""
+    return {categ.id: _category_size_from_name(categ.complete_name) for categ in categories}
+
+
+def _get_category_buckets(env):
+    """Categorías raíz M pequeñas/M grandes y tamaño de cada categoría, con una sola lectura.
+
+    Devuelve ({"small": id, "large": id}, {categ_id: tamaño}). La raíz es la primera
+    categoría (por nombre completo) que cae en el grupo, igual que la búsqueda ilike anterior.
+    """
+    roots = {}
+    size_map = {}
+    for cat in env["product.category"].search_read([], ["complete_name"], order="complete_name"):
+        size = _category_size_from_name(cat["complete_name"])
+        size_map[cat["id"]] = size
+        if size in ("small", "large"):
+            roots.setdefault(size, cat["id"])
+    return roots, size_map
+
+
+def _get_report_products(env):
+    """Productos de las categorías M pequeñas/M grandes (con hijas) y el mapa de tamaños."""
+    roots, size_map = _get_category_buckets(env)
+    Product = env["product.product"]
+    cat_ids = [roots[size] for size in ("small", "large") if size in roots]
+    products = Product.search([("categ_id", "child_of", cat_ids)]) if cat_ids else Product.browse()
+    return products, size_map
+
+
+def _get_plan_scenario(rec, size):
+    """Escenario del motor de capacidad a partir de un registro con turnos, horas, cambios de molde y excedente."""
+    config = _get_report_config(rec.env)
+    if size == "small":
+        capacity = _get_turn_capacity(rec.turns_small, rec.hours_per_turn_small, "small", env=rec.env)
+        max_items = config.base_items_small + int(rec.max_mold_changes_small or 0)
+    else:
+        capacity = _get_turn_capacity(rec.turns_large, rec.hours_per_turn_large, "large", env=rec.env)
+        max_items = config.base_items_large + int(rec.max_mold_changes_large or 0)
+    return {
+        "capacity": capacity,
+        "max_items": max_items,
+        "excess_pct": (rec.excess_pct or 0.0) / 100.0,
+        "selection": rec.selection_method or "ranking",
+        "time_budget": _get_plan_time_budget(rec.env),
+    }
+
+
+def _get_plan_time_budget(env):
+    """Segundos maximos para la seleccion optima por tamaño (mrp_master.opt_plan_time_budget)."""
+    try:
+        budget = float(env["ir.config_parameter"].sudo().get_param(PLAN_TIME_BUDGET_PARAM, default=DEFAULT_TIME_BUDGET))
+    except (TypeError, ValueError):
+        budget = DEFAULT_TIME_BUDGET
+    return budget if budget > 0 else DEFAULT_TIME_BUDGET
+
+
 def _get_orderpoint_map(env, product_ids):
     if not product_ids:
         return {}
@@ -96,6 +178,61 @@ def _get_orderpoint_map(env, product_ids):
     return result
 
 
+def _get_stock_locations(env):
+    """Ubicaciones que usan los reportes, resueltas una vez (cada clave con sus hijas).
+
+    ``stock``: ubicaciones de los almacenes de las compañías activas (equivale a qty_available).
+    ``mp`` y ``pre``: WH/Existencias/MP y WH/Existencias/PREPRODUCCION (o la primera que coincida).
+    """
+    Location = env["stock.location"]
+    roots = {"stock": env["stock.warehouse"].search([("company_id", "in", env.companies.ids)]).view_location_id.ids}
+    for key, exact, pattern in (
+        ("mp", "WH/Existencias/MP", "/MP"),
+        ("pre", "WH/Existencias/PREPRODUCCION", "PREPRODUCCION"),
+    ):
+        loc = Location.search([("complete_name", "=", exact)], limit=1)
+        if not loc:
+            loc = Location.search([("complete_name", "ilike", pattern)], limit=1)
+        roots[key] = loc.ids
+    root_ids = {root_id for ids in roots.values() for root_id in ids}
+    result = {key: [] for key in roots}
+    if not root_ids:
+        return result
+    for loc in Location.search_read([("id", "child_of", list(root_ids))], ["parent_path"]):
+        path_ids = {int(part) for part in (loc["parent_path"] or "").split("/") if part}
+        for key, ids in roots.items():
+            if path_ids.intersection(ids):
+                result[key].append(loc["id"])
+    return result
+
+
+def _get_stock_availability(env, product_ids, locations, keys=None):
+    """Stock por producto para cada grupo de ubicaciones con un solo read_group de stock.quant.
+
+    ``locations`` es el resultado de _get_stock_locations; ``product_ids`` None no filtra productos.
+    Devuelve {clave: {product_id: cantidad}}.
+    """
+    keys = keys or list(locations)
+    result = {key: {} for key in keys}
+    keys_by_location = {}
+    for key in keys:
+        for loc_id in locations.get(key) or []:
+            keys_by_location.setdefault(loc_id, []).append(key)
+    if not keys_by_location or (product_ids is not None and not product_ids):
+        return result
+    domain = [("location_id", "in", list(keys_by_location))]
+    if product_ids is not None:
+        domain.append(("product_id", "in", list(product_ids)))
+    grouped = env["stock.quant"].read_group(domain, ["quantity:sum"], ["product_id", "location_id"], lazy=False)
+    for group in grouped:
+        if not group.get("product_id") or not group.get("location_id"):
+            continue
+        pid = group["product_id"][0]
+        for key in keys_by_location.get(group["location_id"][0], []):
+            result[key][pid] = result[key].get(pid, 0.0) + (group["quantity"] or 0.0)
+    return result
+
+
 def _get_mold_map(env, product_ids):
     if not product_ids:
         return {}
@@ -160,48 +297,270 @@ def _get_in_process_maps(env, report_date):
         else:
             date_field = "create_date"
         domain.append((date_field, "<=", fields.Datetime.to_string(date_end)))
-    productions = Production.search(domain)
-    pt = {}
-    s1 = {}
-    s2 = {}
-    s3 = {}
-    for prod in productions:
-        code = (prod.product_id.default_code or "").strip()
-        kind, raw_code = _classify_code(code)
-        if kind == "ignore":
-            continue
-        suffix = _extract_suffix(raw_code)
-        qty = prod.product_qty or 0.0
-        if kind == "pt":
-            pt[suffix] = pt.get(suffix, 0.0) + qty
-        elif kind == "s1":
-            s1[suffix] = s1.get(suffix, 0.0) + qty
-        elif kind == "s2":
-            s2[suffix] = s2.get(suffix, 0.0) + qty
-        elif kind == "s3":
-            s3[suffix] = s3.get(suffix, 0.0) + qty
-    return pt, s1, s2, s3
-
-
-def _allocate_capacity(items, capacity, key):
-    remaining = capacity
-    for item in sorted(items, key=lambda i: (i.get("priority_rank", 0), i[key]), reverse=True):
-        if remaining <= 0:
-            break
-        if (item.get("required") or 0.0) <= 0.0:
-            continue
-        remaining_req = max(0.0, (item.get("required") or 0.0) - (item.get("produce") or 0.0))
-        need = min(item[key], remaining_req)
-        if need <= 0:
-            continue
-        cap_left = item["cap_left"]
-        alloc = min(need, remaining, cap_left)
-        if alloc <= 0:
+    # Agregado en SQL. Prefijos: VE- se ignora, S3- -> s3, S2-VI- -> s2, VI- -> s1, resto -> pt;
+    # el sufijo se calcula sobre el código sin prefijo igual que _extract_suffix.
+    production_ids = Production.search(domain).ids
+    if not production_ids:
+        return {}, {}, {}, {}
+    Production.flush_model(["product_id", "product_qty"])
+    env["product.product"].flush_model(["default_code"])
+    env.cr.execute(
+        """
+        WITH mo AS (
+            SELECT BTRIM(COALESCE(pp.default_code, ''), E' \\t\\n\\r') AS code,
+                   COALESCE(mp.product_qty, 0.0) AS qty
+              FROM mrp_production mp
+              JOIN product_product pp ON pp.id = mp.product_id
+             WHERE mp.id = ANY(%s)
+        ), classified AS (
+            SELECT CASE
+                       WHEN code LIKE 'VE-%%' THEN 'ignore'
+                       WHEN code LIKE 'S3-%%' THEN 's3'
+                       WHEN code LIKE 'S2-VI-%%' THEN 's2'
+                       WHEN code LIKE 'VI-%%' THEN 's1'
+                       ELSE 'pt'
+                   END AS kind,
+                   CASE
+                       WHEN code LIKE 'S3-%%' THEN substr(code, 4)
+                       WHEN code LIKE 'S2-VI-%%' THEN substr(code, 7)
+                       WHEN code LIKE 'VI-%%' THEN substr(code, 4)
+                       ELSE code
+                   END AS raw_code,
+                   qty
+              FROM mo
+        )
+        SELECT kind,
+               COALESCE(substring(raw_code FROM '([^-]*-[^-]*-T[0-9]+)$'),
+                        substring(raw_code FROM '([^-]*-[^-]*)$'),
+                        raw_code) AS suffix,
+               SUM(qty)
+          FROM classified
+         WHERE kind <> 'ignore'
+         GROUP BY 1, 2
+        """,
+        [production_ids],
+    )
+    maps = {"pt": {}, "s1": {}, "s2": {}, "s3": {}}
+    for kind, suffix, qty in env.cr.fetchall():
+        maps[kind][suffix] = qty or 0.0
+    return maps["pt"], maps["s1"], maps["s2"], maps["s3"]
+
+
+def _explode_bom_demand(env, demand):
+    """Explota la demanda por todos los niveles de las listas de materiales hasta los componentes hoja.
+
+    ``demand`` es {(product_id, bom_id o False): cantidad}; con bom_id False se busca la LdM
+    del producto. Cada (producto, LdM) se explota una sola vez: su vector de requerimiento
+    por unidad queda memorizado y se reutiliza en todos los niveles y demandas. Antes de
+    explotar, el árbol se recorre por niveles con un solo _bom_find por nivel para todos los
+    componentes de ese nivel. Un ciclo entre LdM produce un UserError.
+    Devuelve {component_id: cantidad} en la UdM del componente.
+    """
+    Product = env["product.product"]
+    Bom = env["mrp.bom"]
+    bom_map = {}
+    per_unit = {}
+
+    def _load_boms(product_ids):
+        missing = [pid for pid in product_ids if pid not in bom_map]
+        if not missing:
+            return
+        products = Product.browse(missing)
+        found = Bom._bom_find(products)
+        for product in products:
+            bom_map[product.id] = found.get(product) or Bom
+
+    def _load_tree(product_ids, boms):
+        visited = Bom
+        while True:
+            _load_boms(product_ids)
+            boms = (boms | Bom.concat(*(bom_map[pid] for pid in product_ids))) - visited
+            if not boms:
+                return
+            visited |= boms
+            product_ids = [pid for pid in boms.bom_line_ids.product_id.ids if pid not in bom_map]
+            boms = Bom
+
+    def _requirement(product_id, bom, path):
+        if not bom:
+            return {product_id: 1.0}
+        if product_id in path:
+            cycle = path[path.index(product_id):] + (product_id,)
+            raise UserError(_("Ciclo en las listas de materiales: %s") % " -> ".join(
+                Product.browse(pid).display_name for pid in cycle
+            ))
+        key = (product_id, bom.id)
+        if key in per_unit:
+            return per_unit[key]
+        product = Product.browse(product_id)
+        bom_qty = bom.product_uom_id._compute_quantity(bom.product_qty or 1.0, product.uom_id) or 1.0
+        bom_lines = bom.bom_line_ids.filtered("product_id")
+        vector = {}
+        for bl in bom_lines:
+            comp = bl.product_id
+            qty = bl.product_uom_id._compute_quantity(bl.product_qty or 0.0, comp.uom_id) / bom_qty
+            if not qty:
+                continue
+            for leaf_id, leaf_qty in _requirement(comp.id, bom_map[comp.id], path + (product_id,)).items():
+                vector[leaf_id] = vector.get(leaf_id, 0.0) + qty * leaf_qty
+        per_unit[key] = vector
+        return vector
+
+    _load_tree(
+        list({pid for (pid, bom_id) in demand if not bom_id}),
+        Bom.browse({bom_id for (_pid, bom_id) in demand if bom_id}),
+    )
+    result = {}
+    for (product_id, bom_id), qty in demand.items():
+        bom = Bom.browse(bom_id) if bom_id else bom_map[product_id]
+        if not bom or not qty:
             continue
-        item["produce"] += alloc
-        item["cap_left"] -= alloc
-        remaining -= alloc
-    return remaining
+        for leaf_id, leaf_qty in _requirement(product_id, bom, ()).items():
+            result[leaf_id] = result.get(leaf_id, 0.0) + qty * leaf_qty
+    return result
+
+
+# Foto de las entradas comunes de los cuatro reportes OPT. Solo ids y mapas (nunca
+# recordsets), para poder reutilizarla entre transacciones del mismo proceso.
+ReportInputs = namedtuple("ReportInputs", [
+    "product_ids",
+    "size_map",
+    "sales_map",
+    "priority_map",
+    "orderpoint_map",
+    "mold_map",
+    "in_process_maps",
+    "stock_maps",
+    "fingerprint",
+    "built_at",
+])
+
+_REPORT_INPUTS_CACHE = OrderedDict()
+_REPORT_INPUTS_LOCK = threading.Lock()
+_REPORT_INPUTS_STATS = {"hits": 0, "misses": 0}
+
+
+def _get_inputs_ttl(env):
+    try:
+        ttl = int(env["ir.config_parameter"].sudo().get_param(INPUTS_TTL_PARAM, default=DEFAULT_INPUTS_TTL))
+    except (TypeError, ValueError):
+        ttl = DEFAULT_INPUTS_TTL
+    return max(0, ttl)
+
+
+def _get_inputs_fingerprint(env):
+    """Hash de los contadores de filas insertadas/actualizadas/borradas de las tablas de entrada.
+
+    Sale de las estadísticas de PostgreSQL (pg_stat_user_tables más las de la transacción
+    en curso), sin recorrer las tablas: cuesta lo mismo con o sin acierto y refleja también
+    los borrados. Otros procesos publican sus contadores con unos segundos de retraso, y un
+    reinicio de estadísticas solo provoca una reconstrucción de más.
+    """
+    tables = []
+    for model_name in INPUTS_FINGERPRINT_MODELS:
+        if model_name in env:
+            env[model_name].flush_model()
+            tables.append(env[model_name]._table)
+    if not tables:
+        return ""
+    env.cr.execute(
+        """
+        SELECT s.relname,
+               s.n_tup_ins + s.n_tup_upd + s.n_tup_del + x.n_tup_ins + x.n_tup_upd + x.n_tup_del
+          FROM pg_stat_user_tables s
+          JOIN pg_stat_xact_user_tables x ON x.relid = s.relid
+         WHERE s.schemaname = current_schema()
+           AND s.relname = ANY(%s)
+        """,
+        [tables],
+    )
+    return hashlib.sha1(repr(sorted(env.cr.fetchall())).encode()).hexdigest()
+
+
+def _count_input_changes_since(env, since):
+    """Registros de INPUTS_FINGERPRINT_MODELS modificados después de ``since``: {descripcion: cantidad}."""
+    models_by_table = {}
+    for model_name in INPUTS_FINGERPRINT_MODELS:
+        if model_name in env:
+            env[model_name].flush_model(["write_date"])
+            models_by_table[env[model_name]._table] = env[model_name]
+    if not models_by_table or not since:
+        return {}
+    env.cr.execute(
+        " UNION ALL ".join(
+            f'SELECT \'{table}\', COUNT(*) FROM "{table}" WHERE write_date > %s' for table in models_by_table
+        ),
+        [since] * len(models_by_table),
+    )
+    return {
+        models_by_table[table]._description: count
+        for table, count in env.cr.fetchall() if count
+    }
+
+
+def _build_report_inputs(env, fingerprint):
+    products, size_map = _get_report_products(env)
+    product_ids = products.ids
+    sales_map, priority_map = _get_sales_maps(env, product_ids, None)
+    stock_maps = _get_stock_availability(env, None, _get_stock_locations(env))
+    return ReportInputs(
+        product_ids=tuple(product_ids),
+        size_map=size_map,
+        sales_map=sales_map,
+        priority_map=priority_map,
+        orderpoint_map=_get_orderpoint_map(env, product_ids),
+        mold_map=_get_mold_map(env, product_ids),
+        in_process_maps=_get_in_process_maps(env, None),
+        stock_maps=stock_maps,
+        fingerprint=fingerprint,
+        built_at=fields.Datetime.now(),
+    )
+
+
+def _get_report_inputs(env):
+    """Entradas comunes de los reportes OPT, en cache durante mrp_master.opt_inputs_ttl segundos.
+
+    Se construyen con los permisos del usuario (reglas de registro incluidas), por eso la
+    clave lleva el usuario además de las compañías. La entrada se descarta antes si cambian
+    los contadores de INPUTS_FINGERPRINT_MODELS. Los mapas devueltos se comparten: no modificarlos.
+    Las entradas caducadas se eliminan en cada fallo y la cache no pasa de INPUTS_CACHE_MAX_ENTRIES
+    (LRU), para que no crezca con cada combinación de usuario y compañías.
+    """
+    key = (env.cr.dbname, env.uid, env.su, env.company.id, tuple(env.companies.ids))
+    fingerprint = _get_inputs_fingerprint(env)
+    now = monotonic()
+    with _REPORT_INPUTS_LOCK:
+        cached = _REPORT_INPUTS_CACHE.get(key)
+        if cached and cached[0] > now and cached[1].fingerprint == fingerprint:
+            _REPORT_INPUTS_CACHE.move_to_end(key)
+            _REPORT_INPUTS_STATS["hits"] += 1
+            return cached[1]
+        _REPORT_INPUTS_STATS["misses"] += 1
+        for expired_key in [k for k, (expires, _inputs) in _REPORT_INPUTS_CACHE.items() if expires <= now]:
+            del _REPORT_INPUTS_CACHE[expired_key]
+        _REPORT_INPUTS_CACHE.pop(key, None)
+    inputs = _build_report_inputs(env, fingerprint)
+    expires = monotonic() + _get_inputs_ttl(env)
+    with _REPORT_INPUTS_LOCK:
+        _REPORT_INPUTS_CACHE[key] = (expires, inputs)
+        while len(_REPORT_INPUTS_CACHE) > INPUTS_CACHE_MAX_ENTRIES:
+            _REPORT_INPUTS_CACHE.popitem(last=False)
+    _logger.info(
+        "Entradas de reportes OPT reconstruidas (compañía %s): aciertos=%s fallos=%s",
+        env.company.id, _REPORT_INPUTS_STATS["hits"], _REPORT_INPUTS_STATS["misses"],
+    )
+    return inputs
+
+
+def _describe_report_inputs(inputs):
+    """Texto para el formulario: hora de la foto y metricas de la cache del proceso."""
+    hits = _REPORT_INPUTS_STATS["hits"]
+    total = hits + _REPORT_INPUTS_STATS["misses"]
+    return _("Foto de %(date)s - cache: %(hits)s/%(total)s aciertos") % {
+        "date": fields.Datetime.to_string(inputs.built_at),
+        "hits": hits,
+        "total": total,
+    }
 
 
 class MRPReportProductionDaily(models.TransientModel):
@@ -211,6 +570,9 @@ class MRPReportProductionDaily(models.TransientModel):
 
     name = fields.Char(string="Nombre", default="Reporte diario de produccion")
     report_date = fields.Date(string="Fecha", default=fields.Date.context_today, required=True)
+    inputs_info = fields.Char(string="Datos de entrada", readonly=True)
+    inputs_built_at = fields.Datetime(string="Foto de entradas", readonly=True)
+    inputs_fingerprint = fields.Char(string="Huella de entradas", readonly=True)
     report_type = fields.Selection(
         [("suggested", "Sugerido"), ("general", "General")],
         string="Tipo de reporte",
@@ -227,8 +589,36 @@ class MRPReportProductionDaily(models.TransientModel):
     hours_per_turn_small = fields.Selection([("8", "8"), ("12", "12")], string="Horas por turno (M pequeñas)", default="8", required=True)
     turns_large = fields.Selection([("1", "1"), ("2", "2"), ("3", "3")], string="Turnos M grandes", default="2", required=True)
     hours_per_turn_large = fields.Selection([("8", "8"), ("12", "12")], string="Horas por turno (M grandes)", default="8", required=True)
-    max_mold_changes_small = fields.Integer(string="Max. cambios moldes (peq)", default=5, required=True)
-    max_mold_changes_large = fields.Integer(string="Max. cambios moldes (grandes)", default=4, required=True)
+    max_mold_changes_small = fields.Integer(
+        string="Max. cambios moldes (peq)",
+        default=lambda self: _get_report_config(self.env).max_mold_changes_small,
+        required=True,
+    )
+    max_mold_changes_large = fields.Integer(
+        string="Max. cambios moldes (grandes)",
+        default=lambda self: _get_report_config(self.env).max_mold_changes_large,
+        required=True,
+    )
+    excess_pct = fields.Float(
+        string="Excedente (%)",
+        default=lambda self: _get_report_config(self.env).excess_pct * 100.0,
+        required=True,
+        help="Porcentaje de la capacidad por turno que se reparte como excedente (hasta el maximo).",
+    )
+    selection_method = fields.Selection(
+        SELECTION_METHODS,
+        string="Seleccion de marcas",
+        default="ranking",
+        required=True,
+        help="Ranking: primeras marcas por prioridad, requerido y ventas. "
+             "Optimo: combinacion de marcas que maximiza el requerido cubierto (ponderado por prioridad) "
+             "dentro de la capacidad y los cambios de molde; si excede el tiempo limite usa el ranking.",
+    )
+    optimal_fallback = fields.Boolean(
+        string="Ranking por tiempo",
+        readonly=True,
+        help="La seleccion optima no termino dentro del tiempo limite y se uso el ranking.",
+    )
     line_ids = fields.One2many("mrp.report.production.daily.line", "wizard_id", string="Líneas")
     total_small_count = fields.Integer(string="Total pequeñas", compute="_compute_totals", store=False)
     total_large_count = fields.Integer(string="Total grandes", compute="_compute_totals", store=False)
@@ -268,45 +658,30 @@ class MRPReportProductionDaily(models.TransientModel):
             "context": {},
         }
 
-    def action_generate(self):
+    def _get_plan_items(self):
+        """Items (dict por producto) de M pequeñas y M grandes con demanda, stock y capacidad de moldes."""
         self.ensure_one()
-        self._check_turn_rules()
-        self.line_ids.unlink()
-
-        Product = self.env["product.product"]
-        Category = self.env["product.category"]
-        small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ / M PEQUEÑAS")], limit=1)
-        if not small_cat:
-            small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ / M PEQUENAS")], limit=1)
-        if not small_cat:
-            small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ/M PEQUEÑAS")], limit=1)
-        if not small_cat:
-            small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ/M PEQUENAS")], limit=1)
-        large_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ / M GRANDES")], limit=1)
-        if not large_cat:
-            large_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ/M GRANDES")], limit=1)
-        cat_ids = []
-        if small_cat:
-            cat_ids.append(small_cat.id)
-        if large_cat:
-            cat_ids.append(large_cat.id)
-        products = Product.search([("categ_id", "child_of", cat_ids)]) if cat_ids else Product.browse()
+        inputs = _get_report_inputs(self.env)
+        self.inputs_info = _describe_report_inputs(inputs)
+        self.inputs_built_at = inputs.built_at
+        self.inputs_fingerprint = inputs.fingerprint
+        products = self.env["product.product"].browse(inputs.product_ids)
+        size_map = inputs.size_map
         if not products:
             raise UserError(_("No se encontraron productos en las categorias AUTOMOTRIZ/M PEQUEÑAS o AUTOMOTRIZ/M GRANDES."))
 
-        product_ids = products.ids
         # La fecha solo se usa para mostrar en el PDF, no para filtrar el cálculo interno.
-        sales_map, _priority_map = _get_sales_maps(self.env, product_ids, None)
-        op_map = _get_orderpoint_map(self.env, product_ids)
-        mold_map = _get_mold_map(self.env, product_ids)
-        pt_map, s1_map, s2_map, s3_map = _get_in_process_maps(self.env, None)
+        sales_map = inputs.sales_map
+        op_map = inputs.orderpoint_map
+        mold_map = inputs.mold_map
+        pt_map, s1_map, s2_map, s3_map = inputs.in_process_maps
+        stock_map = inputs.stock_maps["stock"]
 
         items_small = []
         items_large = []
-        lines = []
 
         for product in products:
-            size = _get_category_size(product)
+            size = size_map.get(product.categ_id.id, "other")
             if size not in ("small", "large"):
                 continue
             if self.size_filter != "all" and size != self.size_filter:
@@ -319,7 +694,7 @@ class MRPReportProductionDaily(models.TransientModel):
             s3_qty = s3_map.get(suffix, 0.0)
             in_process = pt_qty + s1_qty + s2_qty + s3_qty
 
-            stock = product.qty_available or 0.0
+            stock = stock_map.get(product.id, 0.0)
             sales = sales_map.get(product.id, 0.0)
             if sales > stock:
                 priority_rank = 3
@@ -367,58 +742,36 @@ class MRPReportProductionDaily(models.TransientModel):
             else:
                 items_large.append(item)
 
-        def _select_top_items(items, max_items):
-            if max_items <= 0:
-                return []
-            ordered = sorted(
-                items,
-                key=lambda i: (i.get("priority_rank", 0), i.get("required", 0.0), i.get("sales", 0.0)),
-                reverse=True,
-            )
-            selected = []
-            for item in ordered:
-                if (item.get("required") or 0.0) <= 0.0:
-                    continue
-                selected.append(item)
-                if len(selected) >= max_items:
-                    break
-            return selected
-
-        def _fill(items, capacity):
-            remaining = capacity
-            remaining = _allocate_capacity(items, remaining, "prio_sales")
-            remaining = _allocate_capacity(items, remaining, "sales")
-            need_min_items = []
-            for item in items:
-                if item["min"] <= 0 and item["max"] <= 0:
-                    continue
-                need_min = max(0.0, item["min"] - (item["stock"] + item["in_process"] - item["sales"]))
-                item["need_min"] = need_min
-                need_min_items.append(item)
-            remaining = _allocate_capacity(need_min_items, remaining, "need_min")
-            need_max_items = []
-            for item in items:
-                if item["max"] <= 0:
-                    continue
-                need_max = max(0.0, item["max"] + item["sales"] - item["stock"] - item["in_process"])
-                item["need_max"] = need_max
-                need_max_items.append(item)
-            remaining = _allocate_capacity(need_max_items, remaining, "need_max")
-            return remaining
-
-        cap_small = _get_turn_capacity(self.turns_small, self.hours_per_turn_small, "small", env=self.env)
-        cap_large = _get_turn_capacity(self.turns_large, self.hours_per_turn_large, "large", env=self.env)
-
-        items_small_sel = items_small
-        items_large_sel = items_large
-        if self.report_type == "suggested":
-            max_small = 22 + int(self.max_mold_changes_small or 0)
-            max_large = 6 + int(self.max_mold_changes_large or 0)
-            items_small_sel = _select_top_items(items_small, max_small)
-            items_large_sel = _select_top_items(items_large, max_large)
-
-        _fill(items_small_sel, cap_small)
-        _fill(items_large_sel, cap_large)
+        return items_small, items_large
+
+    def action_open_scenarios(self):
+        self.ensure_one()
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Comparar escenarios"),
+            "res_model": "mrp.report.production.scenario.wizard",
+            "view_mode": "form",
+            "target": "new",
+            "context": {"default_report_id": self.id},
+        }
+
+    def action_generate(self):
+        self.ensure_one()
+        self._check_turn_rules()
+        self.line_ids.unlink()
+
+        items_small, items_large = self._get_plan_items()
+        lines = []
+        suggested = self.report_type == "suggested"
+        plan_small = _plan_capacity(items_small, [_get_plan_scenario(self, "small")], suggested)[0]
+        plan_large = _plan_capacity(items_large, [_get_plan_scenario(self, "large")], suggested)[0]
+        self.optimal_fallback = (
+            suggested and self.selection_method == "optimal" and not (plan_small["optimal"] and plan_large["optimal"])
+        )
+        if self.optimal_fallback:
+            _logger.info("Seleccion optima OPT sin terminar dentro del tiempo limite; se uso el ranking.")
+        items_small_sel = _apply_plan(items_small, plan_small)
+        items_large_sel = _apply_plan(items_large, plan_large)
 
         def _ensure_needs(items):
             for item in items:
@@ -466,37 +819,10 @@ class MRPReportProductionDaily(models.TransientModel):
             _build_lines(items_small_sel, False, True)
             _build_lines(items_large_sel, False, True)
 
-        def _build_excess(items, capacity):
-            extra_cap = capacity * 0.15
-            remaining = extra_cap
-            candidates = []
+        def _build_excess(items):
             for item in items:
-                if item["min"] <= 0 and item["max"] <= 0:
+                if item["extra"] <= 0:
                     continue
-                if item["max"] > 0:
-                    need = max(0.0, item["max"] + item["sales"] - item["stock"] - item["produce"])
-                else:
-                    need = 0.0
-                if need <= 0:
-                    continue
-                candidates.append({
-                    "ref": item,
-                    "need_ex": need,
-                    "cap_left": item["cap_left"],
-                    "extra": 0.0,
-                })
-            for c in sorted(candidates, key=lambda x: x["need_ex"], reverse=True):
-                if remaining <= 0:
-                    break
-                alloc = min(c["need_ex"], remaining, c["cap_left"])
-                if alloc <= 0:
-                    continue
-                c["extra"] = alloc
-                remaining -= alloc
-            for c in candidates:
-                if c["extra"] <= 0:
-                    continue
-                item = c["ref"]
                 lines.append({
                     "wizard_id": self.id,
                     "product_id": item["product"].id,
@@ -509,15 +835,15 @@ class MRPReportProductionDaily(models.TransientModel):
                     "priority_sales_qty": item["prio_sales"],
                     "in_process_qty": item["in_process"],
                     "molds_qty": item["molds"],
-                    "produce_qty": c["extra"],
+                    "produce_qty": item["extra"],
                     "required_qty": item["required"],
                     "size_category": item["size"],
                     "is_excess": True,
                 })
 
-        if self.report_type != "general":
-            _build_excess(items_small_sel, cap_small)
-            _build_excess(items_large_sel, cap_large)
+        if suggested:
+            _build_excess(items_small_sel)
+            _build_excess(items_large_sel)
 
         if not lines:
             def _build_fallback(items):
@@ -619,11 +945,12 @@ class MRPReportProductionDailyLine(models.TransientModel):
 
     @api.depends("product_id")
     def _compute_product_info(self):
+        size_map = _get_category_size_map(self.product_id.categ_id)
         for line in self:
             prod = line.product_id
             line.product_code = prod.default_code or ""
             line.product_name = prod.name or ""
-            line.size_category = _get_category_size(prod) if prod else False
+            line.size_category = size_map.get(prod.categ_id.id, "other") if prod else False
 
     @api.model_create_multi
     def create(self, vals_list):
@@ -648,23 +975,7 @@ class MRPReportProductionDailyLine(models.TransientModel):
         return super().write(vals)
 
     def _compute_available_products(self):
-        Category = self.env["product.category"]
-        small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ / M PEQUEÑAS")], limit=1)
-        if not small_cat:
-            small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ / M PEQUENAS")], limit=1)
-        if not small_cat:
-            small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ/M PEQUEÑAS")], limit=1)
-        if not small_cat:
-            small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ/M PEQUENAS")], limit=1)
-        large_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ / M GRANDES")], limit=1)
-        if not large_cat:
-            large_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ/M GRANDES")], limit=1)
-        cat_ids = []
-        if small_cat:
-            cat_ids.append(small_cat.id)
-        if large_cat:
-            cat_ids.append(large_cat.id)
-        products = self.env["product.product"].search([("categ_id", "child_of", cat_ids)]) if cat_ids else self.env["product.product"].browse()
+        products, _size_map = _get_report_products(self.env)
         for line in self:
             line.available_product_ids = products
 
@@ -680,7 +991,7 @@ class MRPReportParamsWizard(models.TransientModel):
     rpt_units_large_12 = fields.Integer(string="Unidades por turno (grandes, 12h)")
 
     def _get_master_type(self):
-        return self.env["mrp.master.type"].sudo().search([("active", "=", True)], limit=1)
+        return self.env["mrp.master.type"].sudo().browse(_get_report_config(self.env).type_id)
 
     @api.model
     def default_get(self, fields_list):
@@ -719,6 +1030,9 @@ class MRPReportInProcess(models.TransientModel):
 
     name = fields.Char(string="Nombre", default="Productos en proceso")
     report_date = fields.Date(string="Fecha", default=fields.Date.context_today, required=True)
+    inputs_info = fields.Char(string="Datos de entrada", readonly=True)
+    inputs_built_at = fields.Datetime(string="Foto de entradas", readonly=True)
+    inputs_fingerprint = fields.Char(string="Huella de entradas", readonly=True)
     show_valued = fields.Boolean(string="Valorado", default=False)
     size_filter = fields.Selection(
         [("all", "Todos"), ("small", "M pequeñas"), ("large", "M grandes")],
@@ -758,32 +1072,21 @@ class MRPReportInProcess(models.TransientModel):
         self._check_turn_rules()
         self.line_ids.unlink()
 
-        Product = self.env["product.product"]
-        Category = self.env["product.category"]
-        small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ / M PEQUEÑAS")], limit=1)
-        if not small_cat:
-            small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ / M PEQUENAS")], limit=1)
-        if not small_cat:
-            small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ/M PEQUEÑAS")], limit=1)
-        if not small_cat:
-            small_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ/M PEQUENAS")], limit=1)
-        large_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ / M GRANDES")], limit=1)
-        if not large_cat:
-            large_cat = Category.search([("complete_name", "ilike", "AUTOMOTRIZ/M GRANDES")], limit=1)
-        cat_ids = []
-        if small_cat:
-            cat_ids.append(small_cat.id)
-        if large_cat:
-            cat_ids.append(large_cat.id)
-        products = Product.search([("categ_id", "child_of", cat_ids)]) if cat_ids else Product.browse()
+        inputs = _get_report_inputs(self.env)
+        self.inputs_info = _describe_report_inputs(inputs)
+        self.inputs_built_at = inputs.built_at
+        self.inputs_fingerprint = inputs.fingerprint
+        products = self.env["product.product"].browse(inputs.product_ids)
+        size_map = inputs.size_map
         if not products:
             raise UserError(_("No se encontraron productos en las categorias AUTOMOTRIZ/M PEQUEÑAS o AUTOMOTRIZ/M GRANDES."))
 
         # La fecha solo se usa para mostrar en PDF, no para filtrar cálculos internos.
-        pt_map, s1_map, s2_map, s3_map = _get_in_process_maps(self.env, None)
+        pt_map, s1_map, s2_map, s3_map = inputs.in_process_maps
+        stock_map = inputs.stock_maps["stock"]
         lines = []
         for product in products:
-            size = _get_category_size(product)
+            size = size_map.get(product.categ_id.id, "other")
             if size not in ("small", "large"):
                 continue
             if self.size_filter != "all" and size != self.size_filter:
@@ -802,7 +1105,7 @@ class MRPReportInProcess(models.TransientModel):
                 "product_id": product.id,
                 "product_code": product.default_code or "",
                 "product_name": product.display_name or "",
-                "stock_qty": product.qty_available or 0.0,
+                "stock_qty": stock_map.get(product.id, 0.0),
                 "qty_pt": pt_qty,
                 "qty_s1": s1_qty,
                 "qty_s2": s2_qty,
@@ -855,8 +1158,9 @@ class MRPReportInProcessLine(models.TransientModel):
 
     @api.depends("product_id")
     def _compute_size_category(self):
+        size_map = _get_category_size_map(self.product_id.categ_id)
         for line in self:
-            value = _get_category_size(line.product_id) if line.product_id else False
+            value = size_map.get(line.product_id.categ_id.id, "other") if line.product_id else False
             line.size_category = value if value in ("small", "large") else False
 
     def _compute_row_number(self):
@@ -887,6 +1191,9 @@ class MRPReportRawMaterials(models.TransientModel):
     _description = "Reporte Materias Primas"
 
     report_date = fields.Date(string="Fecha", default=fields.Date.context_today, required=True)
+    inputs_info = fields.Char(string="Datos de entrada", readonly=True)
+    inputs_built_at = fields.Datetime(string="Foto de entradas", readonly=True)
+    inputs_fingerprint = fields.Char(string="Huella de entradas", readonly=True)
     size_filter = fields.Selection(
         [("all", "Todos"), ("small", "M pequeñas"), ("large", "M grandes")],
         string="Tamaño",
@@ -924,7 +1231,8 @@ class MRPReportRawMaterials(models.TransientModel):
         self._check_turn_rules()
         self.line_ids.unlink()
 
-        plan_wizard = self.env["mrp.report.production.daily"].create({
+        # El plan interno no guarda foto propia (ver opt_report_snapshot).
+        plan_wizard = self.env["mrp.report.production.daily"].with_context(opt_skip_snapshot=True).create({
             "report_date": self.report_date,
             "turns_small": self.turns_small,
             "hours_per_turn_small": self.hours_per_turn_small,
@@ -936,34 +1244,12 @@ class MRPReportRawMaterials(models.TransientModel):
         if self.size_filter != "all":
             plan_lines = plan_lines.filtered(lambda l: l.size_category == self.size_filter)
 
-        Bom = self.env["mrp.bom"]
-        def _find_bom(product):
-            if not product:
-                return False
-            if hasattr(Bom, "_bom_find"):
-                try:
-                    return Bom._bom_find(product=product)
-                except TypeError:
-                    try:
-                        return Bom._bom_find(product_tmpl=product.product_tmpl_id)
-                    except TypeError:
-                        pass
-            if getattr(product, "product_tmpl_id", False):
-                return Bom.search([("product_tmpl_id", "=", product.product_tmpl_id.id)], limit=1)
-            return Bom.search([("product_id", "=", product.id)], limit=1)
-        components = {}
+        plan_demand = {}
         for line in plan_lines:
-            product = line.product_id
-            bom = _find_bom(product)
-            if not bom:
-                continue
-            factor = (line.produce_qty or 0.0) / (bom.product_qty or 1.0)
-            for bl in bom.bom_line_ids:
-                comp = bl.product_id
-                qty = (bl.product_qty or 0.0) * factor
-                if not comp:
-                    continue
-                components[comp.id] = components.get(comp.id, 0.0) + qty
+            if line.product_id:
+                key = (line.product_id.id, False)
+                plan_demand[key] = plan_demand.get(key, 0.0) + (line.produce_qty or 0.0)
+        components = _explode_bom_demand(self.env, plan_demand)
 
         Production = self.env["mrp.production"]
         date_end = _end_of_day(self.report_date)
@@ -976,38 +1262,35 @@ class MRPReportRawMaterials(models.TransientModel):
             else:
                 date_field = "create_date"
             domain.append((date_field, "<=", fields.Datetime.to_string(date_end)))
-        productions = Production.search(domain)
+        # En proceso: consumos pendientes de las MOs abiertas, a un solo nivel. Una MO de
+        # subensamble ya aporta sus propios componentes; explotar también la MO padre a
+        # través del subensamble los contaría dos veces. La demanda (product_uom_qty) está en
+        # la UdM del movimiento y se convierte a la del producto.
         comp_in_process = {}
-        for prod in productions:
-            bom = _find_bom(prod.product_id)
-            if not bom:
+        Uom = self.env["uom.uom"]
+        for group in self.env["stock.move"].read_group(
+            [
+                ("raw_material_production_id", "in", Production.search(domain).ids),
+                ("state", "not in", ("done", "cancel")),
+            ],
+            ["product_uom_qty:sum"],
+            ["product_id", "product_uom"],
+            lazy=False,
+        ):
+            if not group.get("product_id"):
                 continue
-            factor = (prod.product_qty or 0.0) / (bom.product_qty or 1.0)
-            for bl in bom.bom_line_ids:
-                comp = bl.product_id
-                qty = (bl.product_qty or 0.0) * factor
-                if not comp:
-                    continue
-                comp_in_process[comp.id] = comp_in_process.get(comp.id, 0.0) + qty
-
-        Location = self.env["stock.location"]
-        loc_mp = Location.search([("complete_name", "=", "WH/Existencias/MP")], limit=1)
-        if not loc_mp:
-            loc_mp = Location.search([("complete_name", "ilike", "/MP")], limit=1)
-        loc_pre = Location.search([("complete_name", "=", "WH/Existencias/PREPRODUCCION")], limit=1)
-        if not loc_pre:
-            loc_pre = Location.search([("complete_name", "ilike", "PREPRODUCCION")], limit=1)
-        Quant = self.env["stock.quant"]
-        stock_mp = {}
-        stock_pre = {}
-        if loc_mp:
-            mp_loc_ids = Location.search([("id", "child_of", loc_mp.id)]).ids
-            grouped = Quant.read_group([("location_id", "in", mp_loc_ids)], ["product_id", "quantity:sum"], ["product_id"])
-            stock_mp = {g["product_id"][0]: g["quantity"] for g in grouped if g.get("product_id")}
-        if loc_pre:
-            pre_loc_ids = Location.search([("id", "child_of", loc_pre.id)]).ids
-            grouped = Quant.read_group([("location_id", "in", pre_loc_ids)], ["product_id", "quantity:sum"], ["product_id"])
-            stock_pre = {g["product_id"][0]: g["quantity"] for g in grouped if g.get("product_id")}
+            product = self.env["product.product"].browse(group["product_id"][0])
+            qty = group["product_uom_qty"] or 0.0
+            if group.get("product_uom"):
+                qty = Uom.browse(group["product_uom"][0])._compute_quantity(qty, product.uom_id)
+            comp_in_process[product.id] = comp_in_process.get(product.id, 0.0) + qty
+
+        inputs = _get_report_inputs(self.env)
+        self.inputs_info = _describe_report_inputs(inputs)
+        self.inputs_built_at = inputs.built_at
+        self.inputs_fingerprint = inputs.fingerprint
+        stock_mp = inputs.stock_maps["mp"]
+        stock_pre = inputs.stock_maps["pre"]
 
         lines = []
         product_ids = set(components.keys())
@@ -1091,8 +1374,9 @@ class MRPReportRawMaterialsLine(models.TransientModel):
 
     @api.depends("product_id")
     def _compute_size_category(self):
+        size_map = _get_category_size_map(self.product_id.categ_id)
         for line in self:
-            value = _get_category_size(line.product_id) if line.product_id else False
+            value = size_map.get(line.product_id.categ_id.id, "other") if line.product_id else False
             line.size_category = value if value in ("small", "large") else False
 
     def _compute_row_number(self):
@@ -1112,6 +1396,9 @@ class MRPReportSalesNoStock(models.TransientModel):
     _description = "Reporte Ventas sin Stock"
 
     report_date = fields.Date(string="Fecha", default=fields.Date.context_today, required=True)
+    inputs_info = fields.Char(string="Datos de entrada", readonly=True)
+    inputs_built_at = fields.Datetime(string="Foto de entradas", readonly=True)
+    inputs_fingerprint = fields.Char(string="Huella de entradas", readonly=True)
     size_filter = fields.Selection(
         [("all", "Todos"), ("small", "M pequeñas"), ("large", "M grandes")],
         string="Tamaño",
@@ -1174,20 +1461,26 @@ class MRPReportSalesNoStock(models.TransientModel):
             prio_map = {}
 
         lines = []
-        pt_map, s1_map, s2_map, s3_map = _get_in_process_maps(self.env, None)
+        inputs = _get_report_inputs(self.env)
+        self.inputs_info = _describe_report_inputs(inputs)
+        self.inputs_built_at = inputs.built_at
+        self.inputs_fingerprint = inputs.fingerprint
+        pt_map, s1_map, s2_map, s3_map = inputs.in_process_maps
         allowed_categ_ids = set()
         if self.categ_id:
             allowed_categ_ids = set(self.env["product.category"].search([("id", "child_of", self.categ_id.id)]).ids)
             allowed_categ_ids.add(self.categ_id.id)
+        size_map = _get_category_size_map(Product.browse(list(sales_map)).categ_id)
+        stock_map = inputs.stock_maps["stock"]
         for pid, qty in sales_map.items():
             product = Product.browse(pid)
-            size = _get_category_size(product) if product else "other"
+            size = size_map.get(product.categ_id.id, "other") if product else "other"
             if self.size_filter != "all" and size != self.size_filter:
                 continue
             if allowed_categ_ids and product.categ_id:
                 if product.categ_id.id not in allowed_categ_ids:
                     continue
-            stock = product.qty_available or 0.0
+            stock = stock_map.get(pid, 0.0)
             if qty <= stock:
                 continue
             if qty > stock:
@@ -1251,8 +1544,9 @@ class MRPReportSalesNoStockLine(models.TransientModel):
 
     @api.depends("product_id")
     def _compute_size_category(self):
+        size_map = _get_category_size_map(self.product_id.categ_id)
         for line in self:
-            line.size_category = _get_category_size(line.product_id) if line.product_id else False
+            line.size_category = size_map.get(line.product_id.categ_id.id, "other") if line.product_id else False
 
     def _compute_row_number(self):
         for line in self:
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import time
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+from .mrp_master_order import _log_timing
+from .opt_capacity import _plan_capacity, np
+from .opt_reports import SELECTION_METHODS, _get_plan_scenario, _validate_turns
+
+TURN_SELECTION = [("1", "1"), ("2", "2"), ("3", "3")]
+HOURS_SELECTION = [("8", "8"), ("12", "12")]
+
+
+class MRPReportProductionScenarioWizard(models.TransientModel):
+    _name = "mrp.report.production.scenario.wizard"
+    _description = "Comparar escenarios de produccion diaria"
+
+    report_id = fields.Many2one("mrp.report.production.daily", string="Reporte", required=True, ondelete="cascade")
+    scenario_ids = fields.One2many("mrp.report.production.scenario", "wizard_id", string="Escenarios")
+    engine = fields.Char("Motor de calculo", readonly=True)
+
+    @api.model
+    def _prepare_default_scenarios(self, report):
+        base = {
+            "turns_small": report.turns_small,
+            "hours_per_turn_small": report.hours_per_turn_small,
+            "turns_large": report.turns_large,
+            "hours_per_turn_large": report.hours_per_turn_large,
+            "max_mold_changes_small": report.max_mold_changes_small,
+            "max_mold_changes_large": report.max_mold_changes_large,
+            "excess_pct": report.excess_pct,
+            "selection_method": report.selection_method,
+        }
+        scenarios = [dict(base, name=_("Actual"), sequence=1)]
+        extra_turn = dict(base, name=_("+1 turno"), sequence=2)
+        changed = False
+        for size in ("small", "large"):
+            turns = int(base[f"turns_{size}"] or 0)
+            hours = int(base[f"hours_per_turn_{size}"] or 0)
+            if turns < 3 and not (turns + 1 == 3 and hours == 12):
+                extra_turn[f"turns_{size}"] = str(turns + 1)
+                changed = True
+        if changed:
+            scenarios.append(extra_turn)
+        scenarios.append(dict(base, name=_("Excedente 20%"), sequence=3, excess_pct=20.0))
+        if report.report_type == "suggested":
+            other = "optimal" if report.selection_method == "ranking" else "ranking"
+            label = _("Actual (óptimo)") if other == "optimal" else _("Actual (ranking)")
+            scenarios.append(dict(base, name=label, sequence=4, selection_method=other))
+        return scenarios
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        report = self.env["mrp.report.production.daily"].browse(res.get("report_id") or self.env.context.get("active_id"))
+        if report.exists() and "scenario_ids" in fields_list:
+            res["report_id"] = report.id
+            res["scenario_ids"] = [(0, 0, vals) for vals in self._prepare_default_scenarios(report)]
+        return res
+
+    def action_compute(self):
+        """Evalua todos los escenarios con una llamada al motor por tamaño y deja los resultados lado a lado."""
+        self.ensure_one()
+        if not self.scenario_ids:
+            raise UserError(_("Agregue al menos un escenario."))
+        start = time.perf_counter()
+        for scenario in self.scenario_ids:
+            _validate_turns(scenario.turns_small, scenario.hours_per_turn_small)
+            _validate_turns(scenario.turns_large, scenario.hours_per_turn_large)
+        report = self.report_id
+        suggested = report.report_type == "suggested"
+        items_by_size = dict(zip(("small", "large"), report._get_plan_items()))
+        results = {scenario.id: {} for scenario in self.scenario_ids}
+        required_total = 0.0
+        for size, items in items_by_size.items():
+            required_total += sum(item["required"] for item in items)
+            specs = [_get_plan_scenario(scenario, size) for scenario in self.scenario_ids]
+            plans = _plan_capacity(items, specs, suggested)
+            for scenario, spec, plan in zip(self.scenario_ids, specs, plans):
+                produce = sum(plan["produce"])
+                results[scenario.id].update({
+                    f"capacity_{size}": spec["capacity"],
+                    f"marks_{size}": len([idx for idx in plan["selected"] if plan["produce"][idx] > 0]),
+                    f"produce_{size}": produce,
+                    f"excess_{size}": sum(plan["extra"]),
+                    f"unused_{size}": max(0.0, spec["capacity"] - produce),
+                })
+                if spec["selection"] == "optimal" and not plan["optimal"]:
+                    results[scenario.id]["optimal_fallback"] = True
+        for scenario in self.scenario_ids:
+            vals = results[scenario.id]
+            vals.setdefault("optimal_fallback", False)
+            produced = vals.get("produce_small", 0.0) + vals.get("produce_large", 0.0)
+            vals["coverage_pct"] = (produced / required_total * 100.0) if required_total else 0.0
+            scenario.write(vals)
+        self.engine = "NumPy" if np is not None else "Python"
+        _log_timing(
+            "mrp.report.production.scenario.wizard.action_compute",
+            start,
+            f"scenarios={len(self.scenario_ids)} items={sum(len(i) for i in items_by_size.values())}",
+        )
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Comparar escenarios"),
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
+
+
+class MRPReportProductionScenario(models.TransientModel):
+    _name = "mrp.report.production.scenario"
+    _description = "Escenario de produccion diaria"
+    _order = "sequence, id"
+
+    wizard_id = fields.Many2one("mrp.report.production.scenario.wizard", required=True, ondelete="cascade")
+    sequence = fields.Integer(default=10)
+    name = fields.Char("Escenario", required=True)
+    turns_small = fields.Selection(TURN_SELECTION, string="Turnos peq", default="2", required=True)
+    hours_per_turn_small = fields.Selection(HOURS_SELECTION, string="Horas peq", default="8", required=True)
+    turns_large = fields.Selection(TURN_SELECTION, string="Turnos grandes", default="2", required=True)
+    hours_per_turn_large = fields.Selection(HOURS_SELECTION, string="Horas grandes", default="8", required=True)
+    max_mold_changes_small = fields.Integer("Cambios moldes peq", default=5)
+    max_mold_changes_large = fields.Integer("Cambios moldes grandes", default=4)
+    excess_pct = fields.Float("Excedente (%)", default=15.0)
+    selection_method = fields.Selection(SELECTION_METHODS, string="Seleccion", default="ranking", required=True)
+    optimal_fallback = fields.Boolean(
+        "Ranking por tiempo", readonly=True,
+        help="La seleccion optima no termino dentro del tiempo limite y se uso el ranking.",
+    )
+    capacity_small = fields.Float("Capacidad peq", digits=(16, 0), readonly=True)
+    capacity_large = fields.Float("Capacidad grandes", digits=(16, 0), readonly=True)
+    marks_small = fields.Integer("Marcas peq", readonly=True)
+    marks_large = fields.Integer("Marcas grandes", readonly=True)
+    produce_small = fields.Float("Producir peq", digits=(16, 0), readonly=True)
+    produce_large = fields.Float("Producir grandes", digits=(16, 0), readonly=True)
+    excess_small = fields.Float("Excedente peq", digits=(16, 0), readonly=True)
+    excess_large = fields.Float("Excedente grandes", digits=(16, 0), readonly=True)
+    unused_small = fields.Float("Sin usar peq", digits=(16, 0), readonly=True)
+    unused_large = fields.Float("Sin usar grandes", digits=(16, 0), readonly=True)
+    coverage_pct = fields.Float("Cobertura requerido (%)", digits=(16, 1), readonly=True)
+
+    def action_apply(self):
+        """Copia los parametros del escenario al reporte y lo regenera."""
+        self.ensure_one()
+        report = self.wizard_id.report_id
+        report.write({
+            "turns_small": self.turns_small,
+            "hours_per_turn_small": self.hours_per_turn_small,
+            "turns_large": self.turns_large,
+            "hours_per_turn_large": self.hours_per_turn_large,
+            "max_mold_changes_small": self.max_mold_changes_small,
+            "max_mold_changes_large": self.max_mold_changes_large,
+            "excess_pct": self.excess_pct,
+            "selection_method": self.selection_method,
+        })
+        return report.action_generate()
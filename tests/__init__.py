@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+from . import test_master_code_sequence
+from . import test_master_export
+from . import test_master_refresh_queue
+from . import test_opt_in_process_maps
+from . import test_opt_capacity
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Benchmark del motor de capacidad del plan diario OPT (models/opt_capacity.py).
+
+No forma parte de la batería de tests ni necesita Odoo; opt_capacity solo depende de la
+biblioteca estándar y, opcionalmente, de NumPy:
+
+    python3 tests/bench_opt_capacity.py [productos] [escenarios]
+
+Mide el plan por ranking con NumPy y en Python puro, y la selección óptima (knapsack)
+frente al ranking: tiempo, si terminó dentro del presupuesto y demanda ponderada cubierta.
+"""
+import importlib.util
+import os
+import random
+import sys
+import time
+
+_spec = importlib.util.spec_from_file_location(
+    "opt_capacity", os.path.join(os.path.dirname(__file__), os.pardir, "models", "opt_capacity.py")
+)
+opt_capacity = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(opt_capacity)
+
+
+def _random_items(rng, count):
+    items = []
+    for _i in range(count):
+        sales = float(rng.choice([0, 0, rng.randint(1, 50)]))
+        stock = float(rng.randint(0, 40))
+        min_qty = float(rng.choice([0, rng.randint(1, 20)]))
+        max_qty = float(rng.choice([0, min_qty + rng.randint(0, 40)]))
+        in_process = float(rng.randint(0, 10))
+        base = max_qty + sales if max_qty else sales
+        molds = rng.choice([0, rng.randint(1, 5)])
+        items.append({
+            "priority_rank": rng.randint(0, 3),
+            "required": max(0.0, base - stock - in_process),
+            "sales": sales,
+            "prio_sales": sales if rng.random() < 0.3 else 0.0,
+            "stock": stock,
+            "in_process": in_process,
+            "min": min_qty,
+            "max": max_qty,
+            "cap_left": float(molds * 8) if molds else 999999.0,
+            "produce": 0.0,
+        })
+    return items
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main(n_items=10000, n_scenarios=20):
+    rng = random.Random(2024)
+    items = _random_items(rng, n_items)
+    scenarios = [
+        {"capacity": 176 + 20 * i, "max_items": 27 + i, "excess_pct": 0.15, "selection": "ranking"}
+        for i in range(n_scenarios)
+    ]
+    print(f"productos={n_items} escenarios={n_scenarios} numpy={'sí' if opt_capacity.np is not None else 'no'}")
+    if opt_capacity.np is not None:
+        elapsed, _plans = _timed(lambda: opt_capacity._plan_capacity(items, scenarios))
+        print(f"ranking NumPy:  {elapsed:8.3f}s")
+    numpy_module, opt_capacity.np = opt_capacity.np, None
+    try:
+        elapsed, _plans = _timed(lambda: opt_capacity._plan_capacity(items, scenarios))
+    finally:
+        opt_capacity.np = numpy_module
+    print(f"ranking Python: {elapsed:8.3f}s")
+
+    print(f"{'capacidad':>9} {'marcas':>6} {'óptimo s':>9} {'terminó':>7} {'valor ranking':>14} {'valor óptimo':>13}")
+    for capacity, max_items in ((176, 5), (704, 12), (1500, 27), (4000, 27)):
+        ranking = opt_capacity._plan_capacity(
+            items, [{"capacity": capacity, "max_items": max_items, "excess_pct": 0.15, "selection": "ranking"}]
+        )[0]
+        elapsed, optimal = _timed(lambda: opt_capacity._plan_capacity(
+            items, [{"capacity": capacity, "max_items": max_items, "excess_pct": 0.15, "selection": "optimal",
+                     "time_budget": opt_capacity.DEFAULT_TIME_BUDGET}]
+        )[0])
+        print(
+            f"{capacity:>9} {max_items:>6} {elapsed:>9.3f} {'sí' if optimal['optimal'] else 'no':>7} "
+            f"{opt_capacity._selection_value(items, ranking['selected'], capacity):>14.0f} "
+            f"{opt_capacity._selection_value(items, optimal['selected'], capacity):>13.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
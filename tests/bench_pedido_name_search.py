@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Benchmark de mrp.pedido.original._name_search sobre 200.000 pedidos.
+
+No forma parte de la batería de tests. Se ejecuta desde un shell de Odoo y deshace
+todos los datos al terminar:
+
+    odoo-bin shell -d <base> < tests/bench_pedido_name_search.py
+
+Compara la búsqueda trigram (similitud + dominio dentro del SQL) con el ILIKE estándar
+del ORM, con y sin dominio, e imprime el plan de la consulta trigram.
+"""
+import statistics
+import time
+
+BENCH_ROWS = 200000
+BENCH_REPEAT = 20
+BENCH_TERMS = ("PED-1234", "PED-19999", "12345", "PED-00042")
+
+
+def _timed(func, repeat=BENCH_REPEAT):
+    samples = []
+    result = None
+    for _i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(samples), max(samples), result
+
+
+def _seed(env, rows):
+    env.cr.execute(
+        """
+        INSERT INTO mrp_pedido_original (name, master_order_count, create_uid, create_date, write_uid, write_date)
+        SELECT 'PED-' || lpad(g::text, 6, '0'), (g %% 3), %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+          FROM generate_series(1, %s) AS g
+        ON CONFLICT (name) DO NOTHING
+        """,
+        [env.uid, env.uid, rows],
+    )
+    env.cr.execute("ANALYZE mrp_pedido_original")
+
+
+def run(env, rows=BENCH_ROWS):
+    Pedido = env["mrp.pedido.original"]
+    domain = [("master_order_count", ">", 0)]
+    try:
+        _seed(env, rows)
+        env.cr.execute("SELECT count(*) FROM mrp_pedido_original")
+        print(f"pedidos: {env.cr.fetchone()[0]}")
+        print(f"{'término':<12} {'caso':<22} {'mediana ms':>10} {'máx ms':>8} {'n':>3}")
+        for term in BENCH_TERMS:
+            cases = (
+                ("trigram", lambda: Pedido._name_search(term, limit=8)),
+                ("trigram + dominio", lambda: Pedido._name_search(term, domain=domain, limit=8)),
+                ("ilike ORM", lambda: Pedido._search([("name", "ilike", term)], limit=8)),
+                ("ilike ORM + dominio", lambda: Pedido._search(domain + [("name", "ilike", term)], limit=8)),
+            )
+            for label, func in cases:
+                median, worst, result = _timed(lambda: list(func()))
+                print(f"{term:<12} {label:<22} {median:>10.2f} {worst:>8.2f} {len(result):>3}")
+        env.cr.execute(
+            """
+            EXPLAIN (ANALYZE, BUFFERS)
+            SELECT id FROM mrp_pedido_original
+             WHERE master_order_count > 0 AND (name ILIKE %s OR name %% %s)
+             ORDER BY similarity(name, %s) DESC, name
+             LIMIT 8
+            """,
+            ["%PED-1234%", "PED-1234", "PED-1234"],
+        )
+        print("\n".join(row[0] for row in env.cr.fetchall()))
+    finally:
+        env.cr.rollback()
+        env.invalidate_all()
+
+
+if "env" in globals():
+    run(env)  # noqa: F821 (definido por odoo-bin shell)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from contextlib import ExitStack, contextmanager
+
+import psycopg2
+
+import odoo
+from odoo import SUPERUSER_ID, api
+from odoo.tests import common
+
+PARALLEL_CONFIRMATIONS = 5
+
+
+@contextmanager
+def environment():
+    """Entorno sobre un cursor real (fuera de la transacción del test), como test_ir_sequence."""
+    registry = odoo.registry(common.get_db_name())
+    with registry.cursor() as cr:
+        yield api.Environment(cr, SUPERUSER_ID, {})
+
+
+@common.tagged('post_install', '-at_install')
+class TestMasterCodeSequence(common.BaseCase):
+    """Confirmaciones simultáneas: los códigos salen de nextval sin tocar la fila del Tipo."""
+
+    def setUp(self):
+        super().setUp()
+        with environment() as env:
+            mtype = env["mrp.master.type"].create({
+                "name": "Tipo test secuencia",
+                "prefix": "TSQ",
+                "opt_prefix": "TSQOPT",
+            })
+            self.type_id = mtype.id
+            self.sequence_ids = (mtype.code_sequence_id | mtype.opt_code_sequence_id).ids
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        with environment() as env:
+            env["mrp.master.type"].browse(self.type_id).unlink()
+            env["ir.sequence"].browse(self.sequence_ids).unlink()
+
+    def test_sequences_created_with_type(self):
+        self.assertEqual(len(self.sequence_ids), 2)
+
+    def test_concurrent_first_confirmation(self):
+        with environment() as env0, environment() as env1:
+            # Otra transacción tiene bloqueada la fila del Tipo (p.ej. alguien lo está editando).
+            env0.cr.execute("SELECT id FROM mrp_master_type WHERE id = %s FOR UPDATE", [self.type_id])
+            env1.cr.execute("SET LOCAL lock_timeout = '2s'")
+            Master = env1["mrp.master.order"]
+            masters = Master.new({"type_id": self.type_id, "stage_type": "opt"}) | Master.new(
+                {"type_id": self.type_id, "stage_type": "opt"}
+            )
+            try:
+                masters._assign_code_on_confirm()
+            except psycopg2.errors.LockNotAvailable:
+                self.fail("La asignación de códigos no debe bloquear la fila de mrp.master.type")
+            names = masters.mapped("name")
+            self.assertEqual(len(set(names)), 2)
+            self.assertTrue(all(name.startswith("TSQOPT-") for name in names))
+
+    def test_parallel_confirmations_get_unique_codes(self):
+        """Varias transacciones confirman órdenes reales del mismo Tipo antes de que ninguna haga commit."""
+        with environment() as env:
+            masters = env["mrp.master.order"].create([
+                {"type_id": self.type_id, "stage_type": "curvado_pvb"} for _i in range(PARALLEL_CONFIRMATIONS)
+            ])
+            master_ids = masters.ids
+        self.addCleanup(self._unlink_masters, master_ids)
+        with ExitStack() as stack:
+            envs = [stack.enter_context(environment()) for _i in master_ids]
+            for env, master_id in zip(envs, master_ids):
+                env.cr.execute("SET LOCAL lock_timeout = '2s'")
+                master = env["mrp.master.order"].browse(master_id)
+                try:
+                    master._assign_code_on_confirm()
+                    master.write({"state": "confirmed"})
+                    master.flush_recordset()
+                except psycopg2.errors.LockNotAvailable:
+                    self.fail("Una confirmación no debe esperar a otra transacción abierta del mismo Tipo")
+            # Todas siguen abiertas: la fila del Tipo no ha quedado bloqueada por ninguna.
+            with environment() as env:
+                try:
+                    env.cr.execute(
+                        "SELECT id FROM mrp_master_type WHERE id = %s FOR NO KEY UPDATE NOWAIT", [self.type_id]
+                    )
+                except psycopg2.errors.LockNotAvailable:
+                    self.fail("Confirmar no debe bloquear la fila de mrp.master.type")
+            for env in envs:
+                env.cr.commit()
+        with environment() as env:
+            masters = env["mrp.master.order"].browse(master_ids)
+            names = masters.mapped("name")
+            self.assertEqual(len(set(names)), len(master_ids))
+            self.assertTrue(all(name.startswith("TSQ-") for name in names))
+            self.assertEqual(set(masters.mapped("state")), {"confirmed"})
+
+    def _unlink_masters(self, master_ids):
+        with environment() as env:
+            env["mrp.master.order"].browse(master_ids).unlink()
+
+    def test_interleaved_transactions_get_distinct_codes(self):
+        with environment() as env0, environment() as env1:
+            first = env0["mrp.master.order"].new({"type_id": self.type_id, "stage_type": "curvado_pvb"})
+            second = env1["mrp.master.order"].new({"type_id": self.type_id, "stage_type": "curvado_pvb"})
+            first._assign_code_on_confirm()
+            second._assign_code_on_confirm()
+            self.assertNotEqual(first.name, second.name)
+            env0.cr.rollback()
+            # El número reservado por una transacción revertida no se reutiliza (se aceptan huecos).
+            third = env1["mrp.master.order"].new({"type_id": self.type_id, "stage_type": "curvado_pvb"})
+            third._assign_code_on_confirm()
+            self.assertNotIn(third.name, (first.name, second.name))
+
+    def test_master_without_type_keeps_fallback_name(self):
+        with environment() as env:
+            master = env["mrp.master.order"].new({"stage_type": "opt"})
+            master._assign_code_on_confirm()
+            self.assertEqual(master.name, "OPT-" + "1".zfill(
+                int(env["ir.config_parameter"].sudo().get_param("mrp_master.code_padding", default="6"))
+            ))
+            env.cr.rollback()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+from unittest.mock import patch
+
+from odoo.tests import common, tagged
+
+from ..models.mrp_master_export import XLSX_MIMETYPE, _create_attachment_from_path
+
+
+@tagged('post_install', '-at_install')
+class TestMasterExport(common.TransactionCase):
+    """El adjunto de la exportación debe contener el archivo, no solo el nombre."""
+
+    def _temp_file(self, content):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(content)
+        return path
+
+    def test_filestore_attachment_keeps_content(self):
+        content = b"codigo;cantidad\nPT-ABC-T1;10\n" * 1000
+        path = self._temp_file(content)
+        attachment = _create_attachment_from_path(self.env, path, {
+            "name": "lineas.csv",
+            "type": "binary",
+            "mimetype": "text/csv",
+        })
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(attachment.store_fname)
+        self.assertEqual(attachment.file_size, len(content))
+        self.assertEqual(attachment.mimetype, "text/csv")
+        attachment.invalidate_recordset()
+        self.assertEqual(attachment.raw, content)
+
+    def test_db_attachment_keeps_content(self):
+        content = b"codigo;cantidad\nVI-ABC-T1;3\n"
+        path = self._temp_file(content)
+        with patch.object(type(self.env["ir.attachment"]), "_storage", return_value="db"):
+            attachment = _create_attachment_from_path(self.env, path, {
+                "name": "lineas.csv",
+                "type": "binary",
+                "mimetype": "text/csv",
+            })
+        self.assertFalse(os.path.exists(path))
+        attachment.invalidate_recordset()
+        self.assertEqual(attachment.raw, content)
+
+    def test_xlsx_export_is_readable(self):
+        action = self.env["mrp.master.order"]._export_sheets_to_attachment("ordenes.xlsx", [])
+        attachment = self.env["ir.attachment"].browse(int(action["url"].split("/")[-1].split("?")[0]))
+        attachment.invalidate_recordset()
+        self.assertEqual(attachment.mimetype, XLSX_MIMETYPE)
+        self.assertTrue(attachment.raw.startswith(b"PK"))
+        self.assertEqual(attachment.file_size, len(attachment.raw))
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+
+import psycopg2
+
+import odoo
+from odoo import SUPERUSER_ID, api, fields
+from odoo.tests import common
+
+PARALLEL_STATIONS = 10
+
+
+@contextmanager
+def environment():
+    """Entorno sobre un cursor real (fuera de la transacción del test), como test_ir_sequence."""
+    registry = odoo.registry(common.get_db_name())
+    with registry.cursor() as cr:
+        yield api.Environment(cr, SUPERUSER_ID, {})
+
+
+@common.tagged('post_install', '-at_install')
+class TestMasterRefreshQueue(common.BaseCase):
+    """Estaciones en paralelo: encolar no bloquea la fila de la orden y el cron no pisa un refresco."""
+
+    def setUp(self):
+        super().setUp()
+        with environment() as env:
+            mtype = env["mrp.master.type"].create({
+                "name": "Tipo test cola",
+                "prefix": "TQC",
+                "opt_prefix": "TQCOPT",
+            })
+            master = env["mrp.master.order"].create({"type_id": mtype.id})
+            product = env["product.product"].create({"name": "Producto test cola", "type": "product"})
+            lines = env["mrp.master.order.line"].create([
+                {
+                    "master_id": master.id,
+                    "master_id_hp_t1": master.id,
+                    "product_id": product.id,
+                    "product_qty": 1.0,
+                }
+                for _i in range(PARALLEL_STATIONS)
+            ])
+            env.flush_all()
+            env.cr.execute("DELETE FROM mrp_master_order_refresh_queue WHERE master_id = %s", [master.id])
+            self.type_id = mtype.id
+            self.sequence_ids = (mtype.code_sequence_id | mtype.opt_code_sequence_id).ids
+            self.master_id = master.id
+            self.product_id = product.id
+            self.line_ids = lines.ids
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        with environment() as env:
+            env.cr.execute("DELETE FROM mrp_master_order_refresh_queue WHERE master_id = %s", [self.master_id])
+            env["mrp.master.order"].browse(self.master_id).unlink()
+            env["product.product"].browse(self.product_id).unlink()
+            env["mrp.master.type"].browse(self.type_id).unlink()
+            env["ir.sequence"].browse(self.sequence_ids).unlink()
+
+    def _queued_rows(self, env):
+        env.cr.execute("SELECT count(*) FROM mrp_master_order_refresh_queue WHERE master_id = %s", [self.master_id])
+        return env.cr.fetchone()[0]
+
+    def test_parallel_stations_do_not_lock_master_row(self):
+        with ExitStack() as stack:
+            # Cada estación edita su propia línea de la misma orden y ninguna confirma todavía.
+            envs = [stack.enter_context(environment()) for _i in self.line_ids]
+            for qty, (env, line_id) in enumerate(zip(envs, self.line_ids), start=2):
+                env.cr.execute("SET LOCAL lock_timeout = '2s'")
+                try:
+                    env["mrp.master.order.line"].browse(line_id).write({"product_qty": float(qty)})
+                    env.flush_all()
+                except psycopg2.errors.LockNotAvailable:
+                    self.fail("Dos estaciones que editan líneas distintas no deben esperarse entre sí")
+            # La cola solo toma FOR KEY SHARE (clave foránea): la orden se puede seguir editando.
+            with environment() as env:
+                try:
+                    env.cr.execute(
+                        "SELECT id FROM mrp_master_order WHERE id = %s FOR NO KEY UPDATE NOWAIT", [self.master_id]
+                    )
+                    env.cr.execute("SET LOCAL lock_timeout = '2s'")
+                    env.cr.execute("UPDATE mrp_master_order SET write_date = write_date WHERE id = %s", [self.master_id])
+                except psycopg2.errors.LockNotAvailable:
+                    self.fail("Editar una línea no debe bloquear la fila de mrp.master.order")
+                env.cr.rollback()
+            for env in envs:
+                env.cr.commit()
+        with environment() as env:
+            self.assertGreaterEqual(self._queued_rows(env), PARALLEL_STATIONS)
+            env["mrp.master.order.refresh.queue"]._process_queue()
+            master = env["mrp.master.order"].browse(self.master_id)
+            expected = sum(range(2, PARALLEL_STATIONS + 2))
+            self.assertAlmostEqual(master.total_qty_hp_t1, expected)
+            self.assertEqual(self._queued_rows(env), 0)
+
+    def test_concurrent_consumers_skip_locked_rows(self):
+        with environment() as env:
+            env["mrp.master.order.refresh.queue"]._enqueue([self.master_id])
+            env.cr.commit()
+        with environment() as env0, environment() as env1:
+            env1.cr.execute("SET LOCAL lock_timeout = '2s'")
+            first = env0["mrp.master.order.refresh.queue"]._process_queue()
+            try:
+                second = env1["mrp.master.order.refresh.queue"]._process_queue()
+            except psycopg2.errors.LockNotAvailable:
+                self.fail("Dos crons simultáneos no deben esperarse entre sí")
+            self.assertGreaterEqual(first, 1)
+            self.assertEqual(second, 0)
+
+    def test_flag_enqueued_before_refresh_is_dropped(self):
+        with environment() as env:
+            env["mrp.master.order.refresh.queue"]._enqueue([self.master_id], mark_needs_refresh=True)
+            env.cr.commit()
+            # El usuario pulsa "Actualizar" después de la edición, pero antes de que pase el cron.
+            env["mrp.master.order"].browse(self.master_id).write({
+                "needs_refresh": False,
+                "last_refresh_at": fields.Datetime.now() + timedelta(seconds=1),
+            })
+            env.cr.commit()
+            env["mrp.master.order.refresh.queue"]._process_queue()
+            self.assertFalse(env["mrp.master.order"].browse(self.master_id).needs_refresh)
+            self.assertEqual(self._queued_rows(env), 0)
+
+    def test_flag_enqueued_after_refresh_marks_master(self):
+        with environment() as env:
+            env["mrp.master.order"].browse(self.master_id).write({
+                "needs_refresh": False,
+                "last_refresh_at": fields.Datetime.now() - timedelta(seconds=5),
+            })
+            env["mrp.master.order.refresh.queue"]._enqueue([self.master_id], mark_needs_refresh=True)
+            env.cr.commit()
+            env["mrp.master.order.refresh.queue"]._process_queue()
+            self.assertTrue(env["mrp.master.order"].browse(self.master_id).needs_refresh)
+
+    def test_totals_only_rows_do_not_mark_master(self):
+        with environment() as env:
+            env["mrp.master.order.refresh.queue"]._enqueue([self.master_id])
+            env.cr.commit()
+            env["mrp.master.order.refresh.queue"]._process_queue()
+            self.assertFalse(env["mrp.master.order"].browse(self.master_id).needs_refresh)
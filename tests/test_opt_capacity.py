@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import itertools
+import random
+from unittest import mock, skipIf
+
+from odoo.tests import common
+
+from ..models import opt_capacity
+
+
+def _random_items(rng, count):
+    """Items como los de _get_plan_items, con cantidades enteras (la DP es exacta en unidades)."""
+    items = []
+    for _i in range(count):
+        sales = float(rng.choice([0, 0, rng.randint(1, 50)]))
+        stock = float(rng.randint(0, 40))
+        min_qty = float(rng.choice([0, rng.randint(1, 20)]))
+        max_qty = float(rng.choice([0, min_qty + rng.randint(0, 40)]))
+        in_process = float(rng.randint(0, 10))
+        base = max_qty + sales if max_qty else sales
+        molds = rng.choice([0, rng.randint(1, 5)])
+        items.append({
+            "priority_rank": rng.randint(0, 3),
+            "required": max(0.0, base - stock - in_process),
+            "sales": sales,
+            "prio_sales": sales if rng.random() < 0.3 else 0.0,
+            "stock": stock,
+            "in_process": in_process,
+            "min": min_qty,
+            "max": max_qty,
+            "cap_left": float(molds * 8) if molds else 999999.0,
+            "produce": 0.0,
+        })
+    return items
+
+
+def _brute_force_value(items, capacity, max_items):
+    eligible = [idx for idx, item in enumerate(items) if item["required"] > 0]
+    return max(
+        opt_capacity._selection_value(items, combo, capacity)
+        for size in range(min(max_items, len(eligible)) + 1)
+        for combo in itertools.combinations(eligible, size)
+    )
+
+
+class TestOptCapacity(common.BaseCase):
+    """Motor de capacidad: paridad NumPy/Python y selección óptima frente a fuerza bruta."""
+
+    def assertPlansEqual(self, left, right):
+        self.assertEqual(left["selected"], right["selected"])
+        for key in ("produce", "cap_left", "extra"):
+            for got, want in zip(left[key], right[key]):
+                self.assertAlmostEqual(got, want, places=6, msg=key)
+
+    @skipIf(opt_capacity.np is None, "NumPy no está instalado")
+    def test_numpy_matches_python(self):
+        rng = random.Random(44)
+        for _case in range(200):
+            items = _random_items(rng, rng.randint(1, 60))
+            scenarios = [
+                {
+                    "capacity": rng.choice([0, 50, 176, 500]),
+                    "max_items": rng.randint(0, 30),
+                    "excess_pct": rng.choice([0.15, 0.2]),
+                    "selection": rng.choice(["ranking", "optimal"]),
+                }
+                for _s in range(4)
+            ]
+            for suggested in (True, False):
+                numpy_plans = opt_capacity._plan_capacity(items, scenarios, suggested)
+                with mock.patch.object(opt_capacity, "np", None):
+                    python_plans = opt_capacity._plan_capacity(items, scenarios, suggested)
+                for numpy_plan, python_plan in zip(numpy_plans, python_plans):
+                    self.assertPlansEqual(numpy_plan, python_plan)
+
+    def test_optimal_selection_matches_brute_force(self):
+        rng = random.Random(45)
+        for _case in range(200):
+            items = _random_items(rng, rng.randint(1, 9))
+            capacity = rng.randint(1, 800)
+            max_items = rng.randint(1, 4)
+            selected, optimal = opt_capacity._select_optimal_items(items, capacity, max_items, time_budget=5)
+            self.assertTrue(optimal)
+            self.assertLessEqual(len(selected), max_items)
+            self.assertAlmostEqual(
+                opt_capacity._selection_value(items, selected, capacity),
+                _brute_force_value(items, capacity, max_items),
+                places=6,
+            )
+
+    def test_optimal_never_worse_than_ranking(self):
+        rng = random.Random(46)
+        for _case in range(50):
+            items = _random_items(rng, 80)
+            capacity = rng.randint(100, 1500)
+            max_items = rng.randint(1, 20)
+            selected, _optimal = opt_capacity._select_optimal_items(items, capacity, max_items, time_budget=5)
+            position = {id(item): idx for idx, item in enumerate(items)}
+            ranking_idx = [position[id(item)] for item in opt_capacity._select_top_items(items, max_items)]
+            self.assertGreaterEqual(
+                opt_capacity._selection_value(items, selected, capacity) + 1e-6,
+                opt_capacity._selection_value(items, ranking_idx, capacity),
+            )
+
+    def test_time_budget_falls_back_to_ranking(self):
+        items = _random_items(random.Random(47), 400)
+        with mock.patch.object(opt_capacity.time, "perf_counter", side_effect=itertools.count(0, 10)):
+            selected, optimal = opt_capacity._select_optimal_items(items, 1500, 20, time_budget=1)
+        self.assertFalse(optimal)
+        ranking = opt_capacity._ranking_order(items)
+        self.assertEqual(selected, [idx for idx in ranking if items[idx]["required"] > 0][:20])
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import common, tagged
+
+from ..models.opt_reports import _classify_code, _extract_suffix, _get_in_process_maps
+
+# (código, cantidades de las MOs): cubre los cinco prefijos, turnos T<n>, espacios y sin guiones.
+SEED_CODES = (
+    ("PT-ABC-T1", (10.0, 5.0)),
+    ("XX-PT-ABC-T1", (2.0,)),
+    ("VI-ABC-T1", (7.0,)),
+    ("VI-VI-ABC-T1", (1.5,)),
+    ("S2-VI-ABC-T1", (4.0, 4.0)),
+    ("S2-VI-DEF-12", (3.0,)),
+    ("S3-ABC-T1", (6.0,)),
+    ("S3-GHI", (2.5,)),
+    ("VE-ABC-T1", (9.0,)),
+    ("  VI-PAD-01  ", (1.0,)),
+    ("SINGUION", (8.0,)),
+    ("A-B-C-T", (1.0,)),
+    ("-X-T2", (1.0,)),
+    (False, (3.0,)),
+)
+
+
+def _oracle_in_process_maps(productions):
+    """Implementación Python previa al agregado SQL."""
+    maps = {"pt": {}, "s1": {}, "s2": {}, "s3": {}}
+    for prod in productions:
+        kind, raw_code = _classify_code((prod.product_id.default_code or "").strip())
+        if kind == "ignore":
+            continue
+        suffix = _extract_suffix(raw_code)
+        maps[kind][suffix] = maps[kind].get(suffix, 0.0) + (prod.product_qty or 0.0)
+    return maps["pt"], maps["s1"], maps["s2"], maps["s3"]
+
+
+@tagged('post_install', '-at_install')
+class TestOptInProcessMaps(common.TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Production = cls.env["mrp.production"]
+        for code, quantities in SEED_CODES:
+            product = cls.env["product.product"].create({
+                "name": f"Producto en proceso {code or 'sin código'}",
+                "type": "product",
+                "default_code": code,
+            })
+            for qty in quantities:
+                Production.create({"product_id": product.id, "product_qty": qty}).action_confirm()
+
+    def test_sql_aggregation_matches_python_classifier(self):
+        maps = _get_in_process_maps(self.env, False)
+        productions = self.env["mrp.production"].search([("state", "in", ["confirmed", "progress", "planned"])])
+        expected = _oracle_in_process_maps(productions)
+        for kind, got, want in zip(("pt", "s1", "s2", "s3"), maps, expected):
+            self.assertEqual(set(got), set(want), kind)
+            for suffix, qty in want.items():
+                self.assertAlmostEqual(got[suffix], qty, places=4, msg=f"{kind} {suffix}")
+
+    def test_seeded_suffixes(self):
+        pt, s1, s2, s3 = _get_in_process_maps(self.env, False)
+        self.assertGreaterEqual(pt.get("PT-ABC-T1", 0.0), 17.0)
+        self.assertGreaterEqual(s1.get("ABC-T1", 0.0), 7.0)
+        self.assertGreaterEqual(s1.get("VI-ABC-T1", 0.0), 1.5)
+        self.assertGreaterEqual(s2.get("DEF-12", 0.0), 3.0)
+        self.assertGreaterEqual(s3.get("GHI", 0.0), 2.5)
+        self.assertNotIn("VE-ABC-T1", pt)
@@ -11,3 +11,5 @@ from . import mrp_import_structural_wizard
 from . import mrp_import_result_wizard
 from . import mrp_master_confirm_wizard
 from . import add_open_mo_wizard
+from . import mrp_master_line_export_wizard
+from . import mrp_master_export_range_wizard
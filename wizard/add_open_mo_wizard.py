@@ -72,10 +72,9 @@ class MrpAddOpenMoWizard(models.TransientModel):
                 po_name = (prod.x_studio_pedido_original or "").strip()
                 if po_name:
                     Pedido = self.env["mrp.pedido.original"].sudo()
-                    pedido = Pedido.search([("name", "=", po_name)], limit=1)
-                    if not pedido and po_name.startswith("PED-"):
-                        pedido = Pedido.create({"name": po_name})
-                    pedido_id = pedido.id if pedido else False
+                    pedido_id = Pedido._get_or_create_name_map([po_name]).get(po_name)
+                    if not pedido_id:
+                        pedido_id = Pedido.search([("name", "=", po_name)], limit=1).id or False
             origin_before = (prod.origin or "").strip()
             vals = {
                 "product_id": prod.product_id.id,
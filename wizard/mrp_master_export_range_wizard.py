@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, _
+from odoo.exceptions import ValidationError
+
+
+class MrpMasterExportRangeWizard(models.TransientModel):
+    _name = 'mrp.master.export.range.wizard'
+    _description = 'Exportar pestañas de Ordenes Maestras por rango de fechas'
+
+    date_from = fields.Date("Desde", required=True, default=lambda self: fields.Date.context_today(self).replace(day=1))
+    date_to = fields.Date("Hasta", required=True, default=fields.Date.context_today)
+    stage_type = fields.Selection([
+        ('curvado_pvb', 'Curvado / PVB'),
+        ('opt', 'Producto Terminado (OPT)'),
+    ], string="Etapa")
+
+    @api.constrains('date_from', 'date_to')
+    def _check_dates(self):
+        for wiz in self:
+            if wiz.date_from and wiz.date_to and wiz.date_from > wiz.date_to:
+                raise ValidationError(_("La fecha 'Desde' no puede ser mayor que 'Hasta'."))
+
+    def action_export(self):
+        """Un libro con una hoja por pestaña para todas las órdenes del rango (ver action_export_xls_date_range)."""
+        self.ensure_one()
+        return self.env['mrp.master.order'].action_export_xls_date_range(
+            self.date_from, self.date_to, self.stage_type,
+        )